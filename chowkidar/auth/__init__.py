@@ -2,10 +2,14 @@ from .authenticate import *
 from .handler import *
 from .verify import *
 from .middleware import *
+from .registry import *
 
 __all__ = [
     'authenticate_user_from_credentials',
     'respond_handling_authentication',
+    'respond_handling_authentication_async',
     'resolve_user_from_request',
-    'ChowkidarAuthMiddleware'
+    'ChowkidarAuthMiddleware',
+    'issues_session',
+    'ends_session'
 ]
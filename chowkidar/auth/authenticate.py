@@ -1,7 +1,7 @@
 import re
 
 from typing import Union
-from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth import authenticate, get_backends, get_user_model
 from django.http import HttpRequest
 
 from ..utils.exceptions import AuthError
@@ -19,7 +19,24 @@ def authenticate_with_username(password: str, username: str, request: HttpReques
     return authenticate(request=request, username=username, password=password)
 
 
+def is_email_backend_enabled() -> bool:
+    from .backends import ChowkidarAuthBackend
+    return any(isinstance(backend, ChowkidarAuthBackend) for backend in get_backends())
+
+
 def authenticate_with_email(password: str, email: str, request: HttpRequest = None):
+    if is_email_backend_enabled():
+        from .backends import email_lookup_error
+        # ChowkidarAuthBackend fetches the user by email & checks the password on it, in a single query
+        token = email_lookup_error.set(None)
+        try:
+            user = authenticate(request=request, email=validate_email(email), password=password)
+            error = email_lookup_error.get()
+        finally:
+            email_lookup_error.reset(token)
+        if user is None and error is not None:
+            raise error
+        return user
     try:
         username = UserModel.objects.get(email=validate_email(email)).username
         return authenticate_with_username(password=password, username=username, request=request)
@@ -0,0 +1,69 @@
+from contextvars import ContextVar
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import make_password
+
+from .hashing import run_password_hasher, check_user_password
+from ..utils.exceptions import AuthError
+
+UserModel = get_user_model()
+
+# why the last lookup of a user by email did not find a single user, for authenticate_with_email to raise
+email_lookup_error = ContextVar('email_lookup_error', default=None)
+
+
+class ChowkidarAuthBackend(ModelBackend):
+    """
+    ModelBackend which also authenticates users by email, fetching the user with a single query.
+    Passwords are verified through the password hashing pool of chowkidar (see PASSWORD_HASHING_POOL_SIZE),
+    instead of on the request thread.
+    """
+
+    def get_user_by_email(self, email: str):
+        """
+        Returns the user with the email, else None - setting email_lookup_error, as raising here would skip the
+        other authentication backends & the user_login_failed signal
+        """
+        users = list(UserModel._default_manager.filter(email=email)[:2])
+        if len(users) == 1:
+            return users[0]
+        if not users:
+            email_lookup_error.set(
+                AuthError(message='An account with this email address does not exist', code='EMAIL_NOT_FOUND')
+            )
+        else:
+            email_lookup_error.set(AuthError(
+                message='We cannot authenticate you with your email address, please enter your username',
+                code='EMAIL_NOT_UNIQUE'
+            ))
+        return None
+
+    def authenticate(self, request, username=None, password=None, email=None, **kwargs):
+        if password is None:
+            return None
+        if username is None and email is not None:
+            user = self.get_user_by_email(email)
+            if user is None:
+                run_password_hasher(make_password, password)
+                return None
+        else:
+            if username is None:
+                username = kwargs.get(UserModel.USERNAME_FIELD)
+            if username is None:
+                return None
+            try:
+                user = UserModel._default_manager.get_by_natural_key(username)
+            except UserModel.DoesNotExist:
+                # Hash the password anyway, so that the response time does not reveal that the user does not exist
+                run_password_hasher(make_password, password)
+                return None
+        if check_user_password(user, password) and self.user_can_authenticate(user):
+            return user
+        return None
+
+
+__all__ = [
+    'ChowkidarAuthBackend',
+    'email_lookup_error'
+]
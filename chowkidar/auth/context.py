@@ -0,0 +1,143 @@
+from typing import Optional
+
+from asgiref.sync import sync_to_async
+from django.http import HttpRequest
+from django.utils.functional import cached_property
+
+from .epoch import is_access_token_revoked
+from .fingerprint import get_user_ip_from_request, get_user_agent_from_request, encode_fingerprint
+from .singleflight import get_refreshed_token
+from ..models import RefreshToken
+from ..settings import REVOKE_SESSIONS_BY_EPOCH, SINGLE_FLIGHT_REFRESH_WINDOW
+from ..utils import decode_payload_from_token, AuthError
+
+
+class AuthContext:
+    """
+    Authentication state of a request - the decoded access token payload, the verified refresh token,
+    the user ID & the fingerprint. Each of these is resolved at most once per request, and is shared by the
+    middleware, the decorators & the response handler.
+    """
+
+    def __init__(self, request: HttpRequest):
+        self.request = request
+        cookies = getattr(request, 'COOKIES', None) or {}
+        self.token = cookies.get('JWT_TOKEN')
+        self.refreshTokenCookie = cookies.get('JWT_REFRESH_TOKEN')
+        self.refreshTokenError = None
+        # set by mutations declared with @issues_session / @ends_session during execution
+        self.issuedSession = None
+        self.endedSession = False
+        # index of the operation being executed, in a batch of operations
+        self.operationIndex = None
+
+    @cached_property
+    def decodedPayload(self) -> Optional[dict]:
+        """ Payload of the access token, if a validly signed & unexpired one was sent """
+        if self.token:
+            try:
+                return decode_payload_from_token(token=self.token)
+            except Exception:
+                pass
+        return None
+
+    @cached_property
+    def payload(self) -> Optional[dict]:
+        """ Payload of the access token, if a valid one was sent which was not revoked by the revocation epoch """
+        payload = self.decodedPayload
+        if payload is not None and REVOKE_SESSIONS_BY_EPOCH and is_access_token_revoked(payload):
+            return None
+        return payload
+
+    @cached_property
+    def refreshedPayload(self) -> Optional[dict]:
+        """
+        Payload of the access token issued for the refresh token of the request by a concurrent request, within
+        SINGLE_FLIGHT_REFRESH_WINDOW - by which the user is resolved without verifying the refresh token again
+        """
+        if not (SINGLE_FLIGHT_REFRESH_WINDOW and self.refreshTokenCookie):
+            return None
+        refreshed = get_refreshed_token(self.refreshTokenCookie, ip=self.ip, userAgent=self.userAgent)
+        if refreshed is None:
+            return None
+        try:
+            payload = decode_payload_from_token(token=refreshed['token'])
+        except Exception:
+            return None
+        if REVOKE_SESSIONS_BY_EPOCH and is_access_token_revoked(payload):
+            return None
+        return payload
+
+    @cached_property
+    def refreshToken(self) -> Optional[RefreshToken]:
+        """ Refresh token of the request verified against the db, if a valid one was sent """
+        if not self.refreshTokenCookie:
+            self.refreshTokenError = AuthError('Refresh Token Missing', code='REFRESH_TOKEN_NOT_FOUND')
+            return None
+        from .verify import verify_refresh_token
+        try:
+            return verify_refresh_token(token=self.refreshTokenCookie)
+        except Exception as e:
+            self.refreshTokenError = e
+            return None
+
+    def get_refresh_token(self) -> RefreshToken:
+        """ Returns the verified refresh token, or raises the error due to which it could not be verified """
+        refreshToken = self.refreshToken
+        if refreshToken is None:
+            raise self.refreshTokenError
+        return refreshToken
+
+    @cached_property
+    def userID(self) -> Optional[str]:
+        payload = self.payload
+        if payload and 'userID' in payload:
+            return payload['userID']
+        if self.refreshTokenCookie:
+            if self.refreshedPayload is not None:
+                return self.refreshedPayload['userID']
+            if self.refreshToken is not None:
+                return self.refreshToken.user_id
+        return None
+
+    def resolve(self) -> Optional[str]:
+        """
+        Resolves the user ID & everything it depends on which may hit the db - the revocation epoch, and the
+        refresh token when there is no valid access token. Nothing is queried when the access token suffices.
+        """
+        return self.userID
+
+    @cached_property
+    def ip(self) -> str:
+        return get_user_ip_from_request(self.request)
+
+    @cached_property
+    def userAgent(self) -> Optional[str]:
+        return get_user_agent_from_request(self.request)
+
+    @cached_property
+    def fingerprint(self) -> str:
+        return encode_fingerprint(ip=self.ip, agent=self.userAgent)
+
+
+def get_auth_context(request: HttpRequest) -> AuthContext:
+    """ Returns the auth context of the request, creating it on first access """
+    context = getattr(request, '_chowkidar_auth_context', None)
+    if context is None:
+        context = AuthContext(request)
+        request._chowkidar_auth_context = context
+    return context
+
+
+async def get_auth_context_async(request: HttpRequest) -> AuthContext:
+    """ Returns the auth context of the request for async views, resolved in a thread as it may hit the db """
+    context = get_auth_context(request)
+    await sync_to_async(context.resolve)()
+    return context
+
+
+__all__ = [
+    'AuthContext',
+    'get_auth_context',
+    'get_auth_context_async'
+]
@@ -0,0 +1,108 @@
+import math
+from typing import Optional
+
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils import timezone
+
+from ..models import RefreshToken, RevocationEpoch
+from ..settings import CHOWKIDAR_CACHE, JWT_REFRESH_TOKEN_EXPIRATION_DELTA, REVOCATION_EPOCH_LOCAL_CACHE_TTL
+
+
+def get_revocation_epoch_key(userID) -> str:
+    return 'chowkidar:epoch:%s' % userID
+
+
+def get_cached_revocation_epoch(userID) -> Optional[tuple]:
+    """
+    Returns the revocation epoch of the user from the cache as (notBefore timestamp, excluded digest in hex),
+    where notBefore is 0 if sessions of the user were never revoked by an epoch. None, if it is not cached.
+    """
+    return caches[CHOWKIDAR_CACHE].get(get_revocation_epoch_key(userID))
+
+
+def get_revocation_epoch_timeout() -> float:
+    """
+    Seconds for which epochs are cached. An epoch matters only till the sessions issued before it expire, but
+    a per-process cache does not see epochs moved by other workers - there, epochs are only cached briefly.
+    """
+    if isinstance(caches[CHOWKIDAR_CACHE], LocMemCache):
+        return REVOCATION_EPOCH_LOCAL_CACHE_TTL.total_seconds()
+    return JWT_REFRESH_TOKEN_EXPIRATION_DELTA.total_seconds()
+
+
+def cache_revocation_epoch(userID, notBefore: float, excludeDigest: Optional[str]) -> tuple:
+    epoch = (notBefore, excludeDigest)
+    caches[CHOWKIDAR_CACHE].set(get_revocation_epoch_key(userID), epoch, timeout=get_revocation_epoch_timeout())
+    return epoch
+
+
+def evict_revocation_epoch(userID) -> None:
+    """ Drops the cached epoch of the user, so that it is read again from the db """
+    caches[CHOWKIDAR_CACHE].delete(get_revocation_epoch_key(userID))
+
+
+def get_revocation_epoch(userID) -> tuple:
+    """ Returns the revocation epoch of the user from the cache, reading it from the db when it is not cached """
+    epoch = get_cached_revocation_epoch(userID)
+    if epoch is None:
+        record = RevocationEpoch.objects.filter(user_id=userID).first()
+        if record is None:
+            return cache_revocation_epoch(userID, notBefore=0, excludeDigest=None)
+        epoch = cache_revocation_epoch(
+            userID,
+            notBefore=record.notBefore.timestamp(),
+            excludeDigest=bytes(record.excludeDigest).hex() if record.excludeDigest else None
+        )
+    return epoch
+
+
+def revoke_sessions_by_epoch(userID, exclude: Optional[RefreshToken] = None) -> None:
+    """
+    Revokes all sessions of the user except the one excluded, by moving the revocation epoch of the user to now.
+    Tokens issued earlier are rejected right away, and their rows are revoked lazily when they are next used.
+    """
+    notBefore = timezone.now()
+    excludeDigest = bytes(exclude.digest) if exclude is not None else None
+    RevocationEpoch.objects.update_or_create(
+        user_id=userID, defaults={'notBefore': notBefore, 'excludeDigest': excludeDigest}
+    )
+    cache_revocation_epoch(
+        userID, notBefore=notBefore.timestamp(), excludeDigest=excludeDigest.hex() if excludeDigest else None
+    )
+
+
+def is_payload_revoked(payload: dict, epoch: tuple) -> bool:
+    """
+    Checks if the access token of the payload was issued before the revocation epoch. iat is in whole seconds,
+    so tokens issued in the second of the epoch are accepted - like those of the session which moved it.
+    """
+    notBefore, excludeDigest = epoch
+    return bool(notBefore) and payload.get('iat', 0) < math.floor(notBefore)
+
+
+def is_access_token_revoked(payload: dict) -> bool:
+    if not payload.get('userID'):
+        return False
+    return is_payload_revoked(payload, get_revocation_epoch(payload['userID']))
+
+
+def is_refresh_token_revoked(refreshToken: RefreshToken) -> bool:
+    """ Checks if the refresh token was issued before the revocation epoch of its user, and is not excluded """
+    notBefore, excludeDigest = get_revocation_epoch(refreshToken.user_id)
+    return (
+        bool(notBefore) and
+        refreshToken.issued.timestamp() < notBefore and
+        bytes(refreshToken.digest).hex() != excludeDigest
+    )
+
+
+__all__ = [
+    'get_revocation_epoch',
+    'get_cached_revocation_epoch',
+    'evict_revocation_epoch',
+    'revoke_sessions_by_epoch',
+    'is_payload_revoked',
+    'is_access_token_revoked',
+    'is_refresh_token_revoked'
+]
@@ -1,6 +1,12 @@
+import base64
+import hashlib
+import hmac
+
 from ipware import get_client_ip
+from django.conf import settings
 from django.core import signing
-from chowkidar.utils import decode_payload_from_token, AuthError, PermissionDenied
+from django.utils.crypto import constant_time_compare
+from chowkidar.utils import AuthError
 
 
 def get_user_ip_from_request(request) -> str:
@@ -15,23 +21,26 @@ def get_user_agent_from_request(request):
         return request.headers['user-agent']
 
 
-def encode_fingerprint(ip, agent):
-    return signing.dumps({"ip": ip,  "agent": agent})
+# bytes of the keyed hash kept in a fingerprint, encoded as 22 url-safe characters
+FINGERPRINT_LENGTH = 16
 
 
-def decode_fingerprint(fingerprint) -> object:
-    return signing.loads(fingerprint)
+def encode_fingerprint(ip, agent) -> str:
+    """ Truncated keyed hash (HMAC-SHA256 with a key derived from SECRET_KEY) of the IP & user agent """
+    key = hashlib.sha256(b'chowkidar.fingerprint' + settings.SECRET_KEY.encode()).digest()
+    message = ('%s\n%s' % (ip or '', agent or '')).encode()
+    digest = hmac.new(key, message, hashlib.sha256).digest()[:FINGERPRINT_LENGTH]
+    return base64.urlsafe_b64encode(digest).rstrip(b'=').decode()
+
 
+def verify_fingerprint(fingerprint: str, ip, agent) -> bool:
+    """ Checks in constant time if the fingerprint is of the IP & user agent """
+    return constant_time_compare(fingerprint, encode_fingerprint(ip=ip, agent=agent))
 
-def decode_fingerprint_from_request(request):
-    try:
-        if 'JWT_REFRESH_TOKEN' in request.COOKIES:
-            payload = decode_payload_from_token(token=request.COOKIES["JWT_REFRESH_TOKEN"])
-            if "fingerprint" in payload:
-                return decode_fingerprint(payload['fingerprint'])
-    except Exception:
-        pass
-    raise PermissionDenied('Failed to decode Fingerprint', code='INVALID_FINGERPRINT')
+
+def decode_fingerprint(fingerprint) -> object:
+    """ Decodes a signed fingerprint, of refresh tokens issued before fingerprints were hashed """
+    return signing.loads(fingerprint)
 
 
 def generate_fingerprint_from_request(request) -> str:
@@ -44,7 +53,7 @@ __all__ = [
     'get_user_ip_from_request',
     'get_user_agent_from_request',
     'encode_fingerprint',
+    'verify_fingerprint',
     'decode_fingerprint',
-    'decode_fingerprint_from_request',
     'generate_fingerprint_from_request'
 ]
@@ -1,127 +1,184 @@
-from django.http import HttpRequest, JsonResponse
+from datetime import datetime, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.http import HttpRequest, HttpResponse
 from django.utils import timezone
 
-from .fingerprint import generate_fingerprint_from_request, decode_fingerprint
-from ..models import RefreshToken
+from .context import AuthContext, get_auth_context
+from .last_login import set_user_last_login
+from .revocation import publish_revocation
+from .singleflight import (
+    refresh_flights,
+    forget_refreshed_token,
+    get_refresh_flight_key,
+    get_refreshed_token,
+    set_refreshed_token
+)
+from ..store import get_refresh_token_store
 from ..settings import (
     JWT_REFRESH_TOKEN_EXPIRATION_DELTA,
     JWT_EXPIRATION_DELTA,
+    REFRESH_TOKEN_COOKIE_FORMAT,
+    SINGLE_FLIGHT_REFRESH_WINDOW,
     UPDATE_USER_LAST_LOGIN_ON_AUTH,
     UPDATE_USER_LAST_LOGIN_ON_REFRESH
 )
-from ..utils import generate_refresh_token, generate_token_from_claims, decode_payload_from_token
+from ..utils import generate_refresh_token, generate_token_from_claims
 from ..utils.cookie import set_cookie, delete_cookie
+from ..utils.refresh_token import encode_compact_refresh_token
+from ..utils.response import json_response
 
 
-def clear_cookies(resp: JsonResponse) -> JsonResponse:
+def clear_cookies(resp: HttpResponse) -> HttpResponse:
     resp = delete_cookie(key='JWT_REFRESH_TOKEN', response=resp)
     resp = delete_cookie(key='JWT_TOKEN', response=resp)
     return resp
 
 
-def generate_refresh_token_cookie_data_from_userID(userID: str, request) -> object:
-    rt = generate_refresh_token(userID=userID, request=request)
-    update_user_last_login(rt.user, isLogin=True)
-
-    fingerprint = generate_fingerprint_from_request(request)
-    decoded = decode_fingerprint(fingerprint)
+def generate_refresh_token_cookie_data(rt, context: AuthContext) -> dict:
+    """ Value of the refresh token cookie as {'token': ..., 'payload': {'exp': ...}}, in REFRESH_TOKEN_COOKIE_FORMAT """
+    if REFRESH_TOKEN_COOKIE_FORMAT == 'compact':
+        return {
+            'token': encode_compact_refresh_token(rt.get_token(), fingerprint=context.fingerprint),
+            'payload': {'exp': int((rt.issued + JWT_REFRESH_TOKEN_EXPIRATION_DELTA).timestamp())}
+        }
     return generate_token_from_claims(
         claims={
             'refreshToken': rt.get_token(),
-            'fingerprint': fingerprint,
-            'ip': decoded['ip'],
-            'userAgent': decoded['agent']
+            'fingerprint': context.fingerprint
         },
         expirationDelta=JWT_REFRESH_TOKEN_EXPIRATION_DELTA
     )
 
 
-def logout_user(request: HttpRequest, result: object, status_code: str) -> JsonResponse:
+def generate_refresh_token_cookie_data_from_userID(userID: str, request) -> object:
+    rt = generate_refresh_token(userID=userID, request=request)
+    update_user_last_login(rt.user, isLogin=True)
+    return generate_refresh_token_cookie_data(rt, context=get_auth_context(request))
+
+
+def logout_user(request: HttpRequest, result: object, status_code: str, pretty: bool = False) -> HttpResponse:
     if 'JWT_REFRESH_TOKEN' in request.COOKIES:
-        refreshToken = request.COOKIES["JWT_REFRESH_TOKEN"]
+        # the access token issued for it to concurrent requests, is not to be reused anymore
+        forget_refreshed_token(request.COOKIES['JWT_REFRESH_TOKEN'])
+        # Revoke refresh token, already verified for the request
+        token = get_auth_context(request).refreshToken
+        if token is not None and get_refresh_token_store().revoke(token):
+            publish_revocation(userID=token.user_id, tokens=[token.get_token()])
+    return clear_cookies(json_response(result, status=status_code, pretty=pretty))
+
+
+def set_value_at_path(data: dict, path: list, value) -> None:
+    """ Sets value in the response data at path (of response keys), if the path exists """
+    for key in path[:-1]:
+        if not isinstance(data, (dict, list)):
+            return
         try:
-            # Revoke refresh token
-            token = RefreshToken.objects.get(token=refreshToken)
-            token.revoked = timezone.now()
-            token.save()
-        except Exception:
-            pass
-        return clear_cookies(JsonResponse(result, status=status_code))
+            data = data[key]
+        except (KeyError, IndexError, TypeError):
+            return
+    if isinstance(data, dict):
+        data[path[-1]] = value
 
 
 def update_user_last_login(user, isLogin=False, isRefresh=False):
-    if isLogin and UPDATE_USER_LAST_LOGIN_ON_AUTH:
-        user.last_login = timezone.now()
-        user.save()
-    if isRefresh and UPDATE_USER_LAST_LOGIN_ON_REFRESH:
-        user.last_login = timezone.now()
-        user.save()
-
-
-def is_auth_result(result: object) -> bool:
-    return (
-        # Password Auth
-        (
-            'authenticateUser' in result['data'] and
-            result['data']['authenticateUser'] and
-            'success' in result['data']['authenticateUser'] and
-            result['data']['authenticateUser']['success'] and
-            result['data']['authenticateUser']['user']['id']
-        ) or
-        # G Auth
-        (
-            'gAuth' in result['data'] and
-            result['data']['gAuth'] and
-            'success' in result['data']['gAuth'] and
-            result['data']['gAuth']['success'] and
-            result['data']['gAuth']['user']['id']
-        ) or
-        # Social Auth
-        (
-            'socialAuth' in result['data'] and
-            result['data']['socialAuth'] and
-            'success' in result['data']['socialAuth'] and
-            result['data']['socialAuth']['success'] and
-            result['data']['socialAuth']['user']['id']
-        ) or
-        # Refresh Token Auth
-        (
-            'setRefreshToken' in result['data'] and
-            result['data']['setRefreshToken'] and
-            'success' in result['data']['setRefreshToken'] and
-            result['data']['setRefreshToken']['success'] and
-            result['data']['setRefreshToken']['user']['id']
-        )
+    if (
+        (isLogin and UPDATE_USER_LAST_LOGIN_ON_AUTH) or
+        (isRefresh and UPDATE_USER_LAST_LOGIN_ON_REFRESH)
+    ):
+        set_user_last_login(user)
+
+
+def set_access_token_cookie(token: str, expires: datetime, resp: HttpResponse) -> HttpResponse:
+    return set_cookie(key='JWT_TOKEN', value=token, expires=expires, response=resp)
+
+
+def refresh_tokens_of_request(context: AuthContext, resp: HttpResponse) -> HttpResponse:
+    """
+    Issues a new access token (and rotates the refresh token on change of fingerprint) using the refresh token.
+    Concurrent requests with the same refresh token are coalesced - the first does the refresh, while the others
+    reuse the access token it issued, for upto SINGLE_FLIGHT_REFRESH_WINDOW.
+    """
+    if not SINGLE_FLIGHT_REFRESH_WINDOW:
+        return refresh_tokens(context=context, resp=resp)
+
+    key = get_refresh_flight_key(context.refreshTokenCookie)
+    with refresh_flights.lock(key, timeout=SINGLE_FLIGHT_REFRESH_WINDOW.total_seconds()):
+        refreshed = get_refreshed_token(context.refreshTokenCookie, ip=context.ip, userAgent=context.userAgent)
+        if refreshed is not None:
+            return set_access_token_cookie(token=refreshed['token'], expires=refreshed['expires'], resp=resp)
+        resp = refresh_tokens(context=context, resp=resp, onRefresh=lambda data: set_refreshed_token(
+            context.refreshTokenCookie, data=data, ip=context.ip, userAgent=context.userAgent
+        ))
+    return resp
+
+
+def refresh_tokens(context: AuthContext, resp: HttpResponse, onRefresh=None) -> HttpResponse:
+    # get refresh token verified for the request. Will throw exceptions if token is invalid
+    rt = context.get_refresh_token()
+
+    # Check if fingerprint has changed due to IP or agent
+    # If changed, issue a new refresh token invalidating the old one
+    if (
+        rt.userAgent != context.userAgent  # User Agent has changed
+        or rt.ip != context.ip  # IP has changed
+    ):
+        # Revoke the old token & issue a new refresh token in its place
+        newToken = get_refresh_token_store().rotate(rt, ip=context.ip, userAgent=context.userAgent)
+        if newToken is not None:
+            data = generate_refresh_token_cookie_data(newToken, context=context)
+            refreshExpiresIn = data['payload']['exp']
+            resp = set_cookie(
+                key='JWT_REFRESH_TOKEN', value=data['token'],
+                expires=refreshExpiresIn, response=resp
+            )
+
+    update_user_last_login(rt.user, isRefresh=True)
+
+    # Generate and set new JWT_AUTH_TOKEN
+    data = generate_token_from_claims(
+        claims={
+            'userID': rt.user.id,
+            'username': rt.user.username,
+            'origIat': rt.issued.timestamp()
+        },
+        expirationDelta=JWT_EXPIRATION_DELTA
     )
+    if onRefresh is not None:
+        onRefresh(data)
+    return set_access_token_cookie(token=data['token'], expires=data['payload']['exp'], resp=resp)
+
+
+def should_refresh_tokens(context: AuthContext) -> bool:
+    """ Checks if a refresh token was sent, while the access token is missing or is past half its validity """
+    if context.refreshTokenCookie is None:
+        return False
+    payload = context.payload
+    if payload is not None:
+        expiry = datetime.fromtimestamp(payload['exp'], tz=dt_timezone.utc)
+        if expiry > timezone.now() + (JWT_EXPIRATION_DELTA/2):
+            return False
+    return True
 
 
 def respond_handling_authentication(
-    request: HttpRequest, result: object, status_code: str
-) -> JsonResponse:
-    if status_code == 200 and result['data']:
-
-        # Issue Token if query is authenticateUser and successful
-        if is_auth_result(result):
-            if 'setRefreshToken' in result['data'] and result['data']['setRefreshToken']['success']:
-                user = result['data']['setRefreshToken']['user']
-            elif 'socialAuth' in result['data'] and result['data']['socialAuth']['success']:
-                user = result['data']['socialAuth']['user']
-            elif 'gAuth' in result['data'] and result['data']['gAuth']['success']:
-                user = result['data']['gAuth']['user']
-            else:
-                user = result['data']['authenticateUser']['user']
-
-            data = generate_refresh_token_cookie_data_from_userID(userID=user['id'], request=request)
+    request: HttpRequest, result: object, status_code: str, pretty: bool = False
+) -> HttpResponse:
+    context = get_auth_context(request)
+    # the session issued / ended last decides the cookies, even for a batch of operations
+    if status_code == 200:
+
+        # Issue Token if a mutation declared with @issues_session was successful
+        if context.issuedSession is not None:
+            session = context.issuedSession
+            data = generate_refresh_token_cookie_data_from_userID(userID=session.userID, request=request)
             refreshExpiresIn = data['payload']['exp']
-            if 'setRefreshToken' in result['data'] and result['data']['setRefreshToken']['success']:
-                result['data']['setRefreshToken']['refreshExpiresIn'] = refreshExpiresIn
-            elif 'socialAuth' in result['data'] and result['data']['socialAuth']['success']:
-                result['data']['socialAuth']['refreshExpiresIn'] = refreshExpiresIn
-            elif 'gAuth' in result['data'] and result['data']['gAuth']['success']:
-                result['data']['gAuth']['refreshExpiresIn'] = refreshExpiresIn
-            else:
-                result['data']['authenticateUser']['refreshExpiresIn'] = refreshExpiresIn
-            resp = JsonResponse(result, status=status_code)
+            # result is a list of results for a batch, and the session has the index of the operation
+            operationResult = result[session.operationIndex] if session.operationIndex is not None else result
+            set_value_at_path(
+                operationResult.get('data'), path=session.path + ['refreshExpiresIn'], value=refreshExpiresIn
+            )
+            resp = json_response(result, status=status_code, pretty=pretty)
 
             # Set JWT Refresh Token
             resp = set_cookie(
@@ -130,94 +187,43 @@ def respond_handling_authentication(
             )
             return resp
 
-        # Revoke Token if query is logoutUser and successful
-        if 'logoutUser' in result['data'] and result['data']['logoutUser']:
-            resp = logout_user(request=request, result=result, status_code=status_code)
+        # Revoke Token if a mutation declared with @ends_session, like logoutUser, was successful
+        if context.endedSession:
+            resp = logout_user(request=request, result=result, status_code=status_code, pretty=pretty)
             return resp
 
     # Refresh Token automatically if token exists
-    if 'JWT_REFRESH_TOKEN' in request.COOKIES:
-        refreshToken = request.COOKIES["JWT_REFRESH_TOKEN"]
-        if 'JWT_TOKEN' in request.COOKIES:
-            token = request.COOKIES['JWT_TOKEN']
-            try:
-                payload = decode_payload_from_token(token=token)
-                expiry = payload['exp']
-                now = timezone.now()
-                if expiry > now + (JWT_EXPIRATION_DELTA/2):
-                    resp = JsonResponse(result, status=status_code)
-                    return resp
-            except Exception:
-                # Generate new token using refresh token
-                pass
-        from .verify import verify_refresh_token
+    if should_refresh_tokens(context):
+        # Generate new token using refresh token
         try:
-            resp = JsonResponse(result, status=status_code)
-
-            # verify and get refresh token. Will throw exceptions if token is invalid
-            rt = verify_refresh_token(refreshToken)
-
-            # Generate fingerprint for current request
-            fingerprint = generate_fingerprint_from_request(request)
-            decoded = decode_fingerprint(fingerprint)
-
-            # Check if fingerprint has changed due to IP or agent
-            # If changed, issue a new refresh token invalidating the old one
-            if (
-                rt.userAgent != decoded['agent']  # User Agent has changed
-                or rt.ip != decoded['ip']  # IP has changed
-            ):
-                # Revoke the old token
-                rt.revoked = timezone.now()
-                rt.save()
-
-                # Issue new refresh token
-                newToken = RefreshToken.objects.create(
-                    user=rt.user,
-                    ip=decoded['ip'],
-                    userAgent=decoded['agent']
-                )
-                data = generate_token_from_claims(
-                    claims={
-                        'refreshToken': newToken.get_token(),
-                        'fingerprint': fingerprint,
-                        'ip': decoded['ip'],
-                        'userAgent': decoded['agent']
-                    },
-                    expirationDelta=JWT_REFRESH_TOKEN_EXPIRATION_DELTA
-                )
-                refreshExpiresIn = data['payload']['exp']
-                resp = set_cookie(
-                    key='JWT_REFRESH_TOKEN', value=data['token'],
-                    expires=refreshExpiresIn, response=resp
-                )
-
-            update_user_last_login(rt.user, isRefresh=True)
-
-            # Generate and set new JWT_AUTH_TOKEN
-            data = generate_token_from_claims(
-                claims={
-                    'userID': rt.user.id,
-                    'username': rt.user.username,
-                    'origIat': rt.issued.timestamp()
-                },
-                expirationDelta=JWT_EXPIRATION_DELTA
-            )
-            JWTExpiry = data['payload']['exp']
-            resp = set_cookie(
-                key='JWT_TOKEN', value=data['token'],
-                expires=JWTExpiry, response=resp
-            )
-
-            return resp
+            resp = json_response(result, status=status_code, pretty=pretty)
+            return refresh_tokens_of_request(context=context, resp=resp)
         except Exception as e:
-            return clear_cookies(JsonResponse(result, status=status_code))
-
-    return JsonResponse(result, status=status_code)
+            return clear_cookies(json_response(result, status=status_code, pretty=pretty))
+
+    return json_response(result, status=status_code, pretty=pretty)
+
+
+async def respond_handling_authentication_async(
+    request: HttpRequest, result: object, status_code: str, pretty: bool = False
+) -> HttpResponse:
+    """
+    respond_handling_authentication for async views. Only responses which issue, end or refresh a session
+    hop to a thread, as they hit the db - other responses are built right away.
+    """
+    context = get_auth_context(request)
+    if (
+        not (status_code == 200 and (context.issuedSession is not None or context.endedSession)) and
+        not should_refresh_tokens(context)
+    ):
+        return json_response(result, status=status_code, pretty=pretty)
+    return await sync_to_async(respond_handling_authentication)(
+        request=request, result=result, status_code=status_code, pretty=pretty
+    )
 
 
 __all__ = [
     'generate_refresh_token_cookie_data_from_userID',
-    'respond_handling_authentication'
+    'respond_handling_authentication',
+    'respond_handling_authentication_async'
 ]
-
@@ -0,0 +1,95 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import check_password, make_password
+
+from ..settings import PASSWORD_HASHING_POOL_SIZE, PASSWORD_HASHING_QUEUE_SIZE
+from ..utils.exceptions import AuthError
+
+
+class PasswordHashingPool:
+    """
+    Bounded pool of threads which hash passwords off the request thread. At most workers + queueSize hashes
+    are in-flight at a time, and any more fail right away with AUTH_BUSY rather than blocking the request.
+    Hashers of Django (hashlib's PBKDF2, argon2-cffi, bcrypt) release the GIL, so threads hash in parallel.
+    """
+
+    def __init__(self, workers: int, queueSize: int = 0):
+        self.workers = workers
+        self.queueSize = queueSize
+        self.completed = 0
+        self.rejected = 0
+        self.queueTime = 0.0
+        self.maxQueueTime = 0.0
+        self._slots = threading.BoundedSemaphore(workers + queueSize)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='chowkidar-hasher')
+        self._lock = threading.Lock()
+
+    def run(self, func, *args, **kwargs):
+        """ Runs func in the pool & returns its result, raises AuthError(code=AUTH_BUSY) if the pool is full """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise AuthError(
+                message='We are processing too many sign-ins right now, please try again in a while',
+                code='AUTH_BUSY'
+            )
+        submitted = time.monotonic()
+
+        def task():
+            waited = time.monotonic() - submitted
+            with self._lock:
+                self.completed += 1
+                self.queueTime += waited
+                self.maxQueueTime = max(self.maxQueueTime, waited)
+            return func(*args, **kwargs)
+
+        try:
+            return self._executor.submit(task).result()
+        finally:
+            self._slots.release()
+
+    def stats(self) -> dict:
+        """ Counters of the pool, with the average & maximum seconds that hashes waited in the queue """
+        with self._lock:
+            return {
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'avgQueueTime': self.queueTime / self.completed if self.completed else 0.0,
+                'maxQueueTime': self.maxQueueTime
+            }
+
+
+password_hashing_pool = (
+    PasswordHashingPool(workers=PASSWORD_HASHING_POOL_SIZE, queueSize=PASSWORD_HASHING_QUEUE_SIZE)
+    if PASSWORD_HASHING_POOL_SIZE else None
+)
+
+
+def run_password_hasher(func, *args, **kwargs):
+    """ Runs the hashing function in the password hashing pool when it is enabled, else on the calling thread """
+    if password_hashing_pool is None:
+        return func(*args, **kwargs)
+    return password_hashing_pool.run(func, *args, **kwargs)
+
+
+def check_user_password(user, password: str) -> bool:
+    """
+    Checks the password of the user like user.check_password(), hashing through run_password_hasher.
+    The password is re-hashed & saved if its hash uses an outdated hasher or iterations.
+    """
+    outdated = []
+    correct = run_password_hasher(check_password, password, user.password, lambda raw: outdated.append(True))
+    if correct and outdated:
+        user.password = run_password_hasher(make_password, password)
+        user.save(update_fields=['password'])
+    return correct
+
+
+__all__ = [
+    'PasswordHashingPool',
+    'password_hashing_pool',
+    'run_password_hasher',
+    'check_user_password'
+]
@@ -0,0 +1,78 @@
+import atexit
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from ..settings import (
+    UPDATE_USER_LAST_LOGIN_INTERVAL,
+    BUFFER_USER_LAST_LOGIN_UPDATES,
+    USER_LAST_LOGIN_FLUSH_INTERVAL
+)
+
+UserModel = get_user_model()
+
+
+class LastLoginBuffer:
+    """ Buffers last_login updates of users in-process, to be written to the db in bulk """
+
+    def __init__(self):
+        self.pending = {}
+        self.lastFlushed = time.monotonic()
+        self._lock = threading.Lock()
+
+    def add(self, userID, lastLogin) -> None:
+        with self._lock:
+            self.pending[userID] = lastLogin
+
+    def is_due(self) -> bool:
+        return time.monotonic() - self.lastFlushed >= USER_LAST_LOGIN_FLUSH_INTERVAL.total_seconds()
+
+    def flush(self) -> int:
+        """ Writes all buffered updates with a bulk update, returns the number of users updated """
+        with self._lock:
+            pending, self.pending = self.pending, {}
+            self.lastFlushed = time.monotonic()
+        if not pending:
+            return 0
+        users = [UserModel(pk=userID, last_login=lastLogin) for userID, lastLogin in pending.items()]
+        UserModel.objects.bulk_update(users, ['last_login'], batch_size=500)
+        return len(users)
+
+
+last_login_buffer = LastLoginBuffer()
+if BUFFER_USER_LAST_LOGIN_UPDATES:
+    atexit.register(last_login_buffer.flush)
+
+
+def flush_last_login_updates() -> int:
+    """ Flushes buffered last_login updates, to be called periodically when they are buffered """
+    return last_login_buffer.flush()
+
+
+def set_user_last_login(user) -> None:
+    """
+    Sets last_login of the user to now, skipped if it was set within UPDATE_USER_LAST_LOGIN_INTERVAL.
+    Only last_login is written, either right away or through the buffer.
+    """
+    now = timezone.now()
+    if (
+        UPDATE_USER_LAST_LOGIN_INTERVAL and
+        user.last_login and
+        now - user.last_login < UPDATE_USER_LAST_LOGIN_INTERVAL
+    ):
+        return
+    user.last_login = now
+    if BUFFER_USER_LAST_LOGIN_UPDATES:
+        last_login_buffer.add(user.pk, now)
+        if last_login_buffer.is_due():
+            last_login_buffer.flush()
+    else:
+        user.save(update_fields=['last_login'])
+
+
+__all__ = [
+    'set_user_last_login',
+    'flush_last_login_updates'
+]
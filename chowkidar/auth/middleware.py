@@ -1,39 +1,74 @@
+from functools import lru_cache
+
 from .verify import resolve_user_from_request
 from ..settings import PROTECT_GRAPHQL
 
+# root fields through which the schema can be introspected
+PROTECTED_FIELDS = ('__schema', '_debug')
+
+
+@lru_cache(maxsize=None)
+def get_decoy_schema():
+    from graphql import GraphQLObjectType, GraphQLField, GraphQLSchema, GraphQLString
+    # Don't worry, its simply to show a fake query on introspection
+    query = GraphQLObjectType(
+        "Query", lambda: {
+            "DJANGO_SECRET_KEY": GraphQLField(
+                GraphQLString,
+                description='Get django secret key',
+                resolver=lambda *_: "NOT_SUPPORTED"
+            ),
+        }
+    )
+    return GraphQLSchema(query=query)
+
+
+def is_introspection_allowed(request) -> bool:
+    return not PROTECT_GRAPHQL or bool(
+        hasattr(request, 'user') and request.user and request.user.is_staff
+    )
+
+
+def resolve_authentication(request) -> None:
+    """ Resolves the user of the request once, and sets it at request.userID """
+    if not hasattr(request, 'ChowkidarIDResolved'):
+        request.userID = resolve_user_from_request(request)
+        request.ChowkidarIDResolved = True
+
+
+class IntrospectionProtectionMiddleware:
+    """
+    Shows a decoy schema when introspected. Added by GraphQLView only for operations that select
+    protected fields, so that other operations run without any per-field cost.
+    """
+
+    def resolve(self, next, root, info, **kwargs):
+        if info.field_name in PROTECTED_FIELDS:
+            info.schema = get_decoy_schema()
+        return next(root, info, **kwargs)
+
 
 class ChowkidarAuthMiddleware:
+    """
+    Resolves auth & protects introspection on every field. GraphQLView does this once per operation instead,
+    and skips this middleware - it is required only when executing the schema without GraphQLView.
+    """
 
     def resolve(self, next, root, info, **kwargs):
-        context = info.context
-        if not hasattr(info.context, 'ChowkidarIDResolved'):
-            userID = resolve_user_from_request(context)
-            info.context.userID = userID
-            info.context.ChowkidarIDResolved = True
+        resolve_authentication(info.context)
 
         if (
-            (
-                PROTECT_GRAPHQL and
-                not (hasattr(info.context, 'user') and info.context.user and info.context.user.is_staff)
-            ) and
-            (info.field_name == '__schema' or info.field_name == '_debug')
+            info.field_name in PROTECTED_FIELDS and
+            not is_introspection_allowed(info.context)
         ):
-            from graphql import GraphQLObjectType, GraphQLField, GraphQLSchema, GraphQLString
-            # Don't worry, its simply to show a fake query on introspection
-            query = GraphQLObjectType(
-                "Query", lambda: {
-                    "DJANGO_SECRET_KEY": GraphQLField(
-                        GraphQLString,
-                        description='Get django secret key',
-                        resolver=lambda *_: "NOT_SUPPORTED"
-                    ),
-                }
-            )
-            info.schema = GraphQLSchema(query=query)
-            return next(root, info, **kwargs)
+            info.schema = get_decoy_schema()
         return next(root, info, **kwargs)
 
 
 __all__ = [
-    'ChowkidarAuthMiddleware'
+    'ChowkidarAuthMiddleware',
+    'IntrospectionProtectionMiddleware',
+    'resolve_authentication',
+    'is_introspection_allowed',
+    'PROTECTED_FIELDS'
 ]
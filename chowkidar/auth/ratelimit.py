@@ -0,0 +1,98 @@
+import hashlib
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.core.cache import caches
+
+from .context import get_auth_context
+from ..settings import CHOWKIDAR_CACHE, AUTH_RATE_LIMIT_PER_IP, AUTH_RATE_LIMIT_PER_IDENTITY
+from ..utils.exceptions import AuthError
+
+
+def get_rate_limit_window_keys(key: str, window: timedelta) -> tuple:
+    """ Keys of the counts of the previous & the current window, with the overlap of the previous one """
+    seconds = window.total_seconds()
+    now = time.time()
+    index = int(now // seconds)
+    overlap = 1 - (now % seconds) / seconds
+    return 'chowkidar:rl:%s:%d' % (key, index - 1), 'chowkidar:rl:%s:%d' % (key, index), overlap
+
+
+def is_rate_limited(key: str, limit: int, window: timedelta) -> bool:
+    """
+    Checks if another attempt against key exceeds the limit in a sliding window - the count of the previous
+    window weighted by its overlap with the sliding window, plus the count of the current one
+    """
+    previousKey, currentKey, overlap = get_rate_limit_window_keys(key, window)
+    counts = caches[CHOWKIDAR_CACHE].get_many([previousKey, currentKey])
+    return counts.get(previousKey, 0) * overlap + counts.get(currentKey, 0) >= limit
+
+
+def count_rate_limit_hit(key: str, window: timedelta) -> None:
+    cache = caches[CHOWKIDAR_CACHE]
+    previousKey, currentKey, overlap = get_rate_limit_window_keys(key, window)
+    timeout = int(window.total_seconds() * 2) + 1
+    if not cache.add(currentKey, 1, timeout=timeout):
+        try:
+            cache.incr(currentKey)
+        except ValueError:
+            # expired between add & incr
+            cache.set(currentKey, 1, timeout=timeout)
+
+
+def hit_rate_limit(key: str, limit: int, window: timedelta) -> bool:
+    """ Counts an attempt against key in a sliding window, returns False without counting it if it is over the limit """
+    if is_rate_limited(key, limit=limit, window=window):
+        return False
+    count_rate_limit_hit(key, window=window)
+    return True
+
+
+def get_rate_limit_key(scope: str, kind: str, value: str) -> str:
+    return '%s:%s:%s' % (scope, kind, hashlib.sha256(value.strip().lower().encode()).hexdigest()[:32])
+
+
+def check_rate_limits(request, scope: str, identity: str = None) -> None:
+    """
+    Counts an attempt of scope from the IP of the request & for the identity (like a username or email),
+    raises AuthError(code=RATE_LIMITED) if either is over its limit. Every limit is checked before any is counted,
+    so that attempts rejected for an identity do not use up the limit of the IP.
+    """
+    limits = []
+    if AUTH_RATE_LIMIT_PER_IP:
+        limits.append((get_rate_limit_key(scope, 'ip', get_auth_context(request).ip or ''), AUTH_RATE_LIMIT_PER_IP))
+    if AUTH_RATE_LIMIT_PER_IDENTITY and identity:
+        limits.append((get_rate_limit_key(scope, 'identity', identity), AUTH_RATE_LIMIT_PER_IDENTITY))
+    for key, (limit, window) in limits:
+        if is_rate_limited(key, limit=limit, window=window):
+            raise AuthError('Too many attempts, please try again in a while', code='RATE_LIMITED')
+    for key, (limit, window) in limits:
+        count_rate_limit_hit(key, window=window)
+
+
+def rate_limited(scope: str, identity=None):
+    """
+    Rate limits attempts of a mutation by IP (AUTH_RATE_LIMIT_PER_IP), and by the identity returned by
+    identity(kwargs) for the arguments of the mutation (AUTH_RATE_LIMIT_PER_IDENTITY).
+    Attempts over the limit are rejected before the mutation runs.
+    """
+    def decorator(mutate):
+        @wraps(mutate)
+        def wrapper(root, info, *args, **kwargs):
+            check_rate_limits(info.context, scope=scope, identity=identity(kwargs) if identity else None)
+            return mutate(root, info, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def get_credential_identity(kwargs: dict):
+    return kwargs.get('username') or kwargs.get('email')
+
+
+__all__ = [
+    'hit_rate_limit',
+    'check_rate_limits',
+    'rate_limited',
+    'get_credential_identity'
+]
@@ -0,0 +1,62 @@
+from functools import wraps
+
+from .context import get_auth_context
+
+
+class IssuedSession:
+    """
+    A session issued by a mutation during execution for the user with userID, at path of the response
+    of the operation with operationIndex in a batch (None, if not batched).
+    """
+
+    def __init__(self, userID, path: list, operationIndex: int = None):
+        self.userID = userID
+        self.path = path
+        self.operationIndex = operationIndex
+
+
+def get_user_id(user):
+    if isinstance(user, dict):
+        return user.get('id')
+    return getattr(user, 'id', None)
+
+
+def issues_session(mutate):
+    """
+    Declares that a mutation issues a session (sets the refresh token cookie) to the user it returns on success,
+    as {"success": True, "user": user}. The view learns of it from the auth context, rather than from the response.
+    """
+    @wraps(mutate)
+    def wrapper(root, info, *args, **kwargs):
+        result = mutate(root, info, *args, **kwargs)
+        success = result.get('success') if isinstance(result, dict) else getattr(result, 'success', None)
+        user = result.get('user') if isinstance(result, dict) else getattr(result, 'user', None)
+        userID = get_user_id(user)
+        if success and userID:
+            context = get_auth_context(info.context)
+            context.issuedSession = IssuedSession(
+                userID=userID, path=list(info.path), operationIndex=context.operationIndex
+            )
+            context.endedSession = False
+        return result
+    return wrapper
+
+
+def ends_session(mutate):
+    """ Declares that a mutation ends the session of the user (revokes the token & clears cookies) on success """
+    @wraps(mutate)
+    def wrapper(root, info, *args, **kwargs):
+        result = mutate(root, info, *args, **kwargs)
+        if result:
+            context = get_auth_context(info.context)
+            context.endedSession = True
+            context.issuedSession = None
+        return result
+    return wrapper
+
+
+__all__ = [
+    'issues_session',
+    'ends_session',
+    'IssuedSession'
+]
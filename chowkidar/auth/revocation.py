@@ -0,0 +1,49 @@
+import logging
+from typing import List, Optional
+
+from asgiref.sync import async_to_sync
+
+from ..models import TOKEN_HINT_LENGTH
+from ..settings import REVOCATION_CHANNEL_LAYER
+
+logger = logging.getLogger(__name__)
+
+# group of the channel layer to which every worker listens for revocations
+REVOCATION_GROUP = 'chowkidar-revocations'
+
+
+def get_token_hint(token: Optional[str]) -> Optional[str]:
+    """ Non-usable prefix of a refresh token, by which revoked tokens are matched across workers """
+    return token[:TOKEN_HINT_LENGTH] if token else None
+
+
+def publish_revocation(userID, tokens: List[str] = None, exclude: str = None) -> None:
+    """
+    Publishes the revocation of refresh tokens of the user on REVOCATION_CHANNEL_LAYER - of the tokens,
+    or of all tokens except the one excluded when tokens is None, so that every ASGI worker with open sockets can
+    evict its socket caches & close the sockets of the revoked sessions. Revocations are not published if the
+    layer is not set.
+    """
+    if not REVOCATION_CHANNEL_LAYER:
+        return
+    from channels.layers import get_channel_layer
+    layer = get_channel_layer(REVOCATION_CHANNEL_LAYER)
+    if layer is None:
+        return
+    try:
+        async_to_sync(layer.group_send)(REVOCATION_GROUP, {
+            'type': 'chowkidar.revoked',
+            'userID': str(userID),
+            'tokens': [get_token_hint(token) for token in tokens] if tokens is not None else None,
+            'exclude': get_token_hint(exclude)
+        })
+    except Exception:
+        # the tokens are revoked already, workers only lose the chance to act on it right away
+        logger.exception('Failed to publish the revocation of refresh tokens of user %s', userID)
+
+
+__all__ = [
+    'REVOCATION_GROUP',
+    'get_token_hint',
+    'publish_revocation'
+]
@@ -0,0 +1,110 @@
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from django.core.cache import caches
+
+from ..settings import CHOWKIDAR_CACHE, SINGLE_FLIGHT_REFRESH_WINDOW
+
+
+class SingleFlight:
+    """
+    Per-process table of locks keyed by a string, so that only one thread at a time does the work for a key
+    while others wait for it. Locks are dropped from the table once no thread holds or waits on them.
+    """
+
+    def __init__(self):
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def lock(self, key: str, timeout: float):
+        """ Waits for the lock of the key upto timeout seconds, yields whether it was acquired """
+        with self._lock:
+            entry = self._locks.get(key)
+            if entry is None:
+                entry = self._locks[key] = [threading.Lock(), 0]
+            entry[1] += 1
+        acquired = entry[0].acquire(timeout=timeout)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                entry[0].release()
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
+
+    def __len__(self):
+        return len(self._locks)
+
+
+refresh_flights = SingleFlight()
+
+
+def get_refresh_flight_key(refreshToken: str) -> str:
+    return 'chowkidar:refreshed:%s' % hashlib.sha256(refreshToken.encode()).hexdigest()
+
+
+def get_refresh_flight_revocation_key(userID) -> str:
+    return 'chowkidar:refreshed-revoked:%s' % userID
+
+
+def get_refreshed_token(refreshToken: str, ip: str, userAgent: Optional[str]) -> Optional[dict]:
+    """
+    Access token issued for the refresh token by a concurrent request of the same ip & user agent, if any,
+    and if no token of its user was revoked since
+    """
+    cache = caches[CHOWKIDAR_CACHE]
+    refreshed = cache.get(get_refresh_flight_key(refreshToken))
+    if not (refreshed and refreshed['ip'] == ip and refreshed['userAgent'] == userAgent):
+        return None
+    revokedAt = cache.get(get_refresh_flight_revocation_key(refreshed['userID']))
+    if revokedAt is not None and refreshed['issued'] <= revokedAt:
+        return None
+    return refreshed
+
+
+def set_refreshed_token(refreshToken: str, data: dict, ip: str, userAgent: Optional[str]) -> None:
+    """ Shares the access token issued in data for the refresh token with concurrent requests """
+    caches[CHOWKIDAR_CACHE].set(
+        get_refresh_flight_key(refreshToken), {
+            'token': data['token'],
+            'expires': data['payload']['exp'],
+            'userID': data['payload']['userID'],
+            'issued': time.time(),
+            'ip': ip,
+            'userAgent': userAgent
+        },
+        timeout=SINGLE_FLIGHT_REFRESH_WINDOW.total_seconds()
+    )
+
+
+def forget_refreshed_token(refreshToken: str) -> None:
+    caches[CHOWKIDAR_CACHE].delete(get_refresh_flight_key(refreshToken))
+
+
+def forget_refreshed_tokens_of_user(userID) -> None:
+    """
+    Stops reusing the access tokens shared so far for refresh tokens of the user, when any of them is revoked -
+    the refresh tokens of such requests are verified again instead
+    """
+    if SINGLE_FLIGHT_REFRESH_WINDOW:
+        caches[CHOWKIDAR_CACHE].set(
+            get_refresh_flight_revocation_key(userID), time.time(),
+            timeout=SINGLE_FLIGHT_REFRESH_WINDOW.total_seconds()
+        )
+
+
+__all__ = [
+    'SingleFlight',
+    'refresh_flights',
+    'get_refresh_flight_key',
+    'get_refreshed_token',
+    'set_refreshed_token',
+    'forget_refreshed_token',
+    'forget_refreshed_tokens_of_user'
+]
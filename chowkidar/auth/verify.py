@@ -3,11 +3,20 @@ from typing import Optional
 from django.http import HttpRequest
 from django.contrib.auth import get_user_model
 from django.utils import timezone
+from django.utils.crypto import constant_time_compare
 
-from .fingerprint import decode_fingerprint
+from .context import get_auth_context
+from .epoch import is_access_token_revoked, is_refresh_token_revoked
+from .fingerprint import decode_fingerprint, verify_fingerprint
 from ..models import RefreshToken
-from ..settings import JWT_REFRESH_TOKEN_EXPIRATION_DELTA
+from ..store import get_refresh_token_store
+from ..settings import JWT_REFRESH_TOKEN_EXPIRATION_DELTA, REVOKE_SESSIONS_BY_EPOCH
 from ..utils import decode_payload_from_token, AuthError
+from ..utils.refresh_token import (
+    decode_compact_refresh_token,
+    get_compact_refresh_token_mac,
+    is_compact_refresh_token
+)
 
 UserModel = get_user_model()
 
@@ -17,7 +26,8 @@ def resolve_user_from_tokens(token=None, refreshToken=None) -> Optional[str]:
         try:
             payload = decode_payload_from_token(token=token)
             try:
-                return payload['userID']
+                if not (REVOKE_SESSIONS_BY_EPOCH and is_access_token_revoked(payload)):
+                    return payload['userID']
             except Exception:
                 pass
         except Exception:
@@ -25,50 +35,71 @@ def resolve_user_from_tokens(token=None, refreshToken=None) -> Optional[str]:
     if refreshToken:
         try:
             refreshToken = verify_refresh_token(token=refreshToken)
-            return refreshToken.user.id
+            return refreshToken.user_id
         except Exception:
             pass
     return None
 
 
 def resolve_user_from_request(request: HttpRequest) -> str:
-    return resolve_user_from_tokens(
-        token=request.COOKIES["JWT_TOKEN"] if 'JWT_TOKEN' in request.COOKIES else None,
-        refreshToken=request.COOKIES["JWT_REFRESH_TOKEN"] if 'JWT_REFRESH_TOKEN' in request.COOKIES else None
-    )
+    return get_auth_context(request).userID
+
+
+def check_refresh_token_epoch(token: RefreshToken) -> None:
+    """ Raises AuthError if the token was revoked by the revocation epoch of its user, revoking its row as well """
+    if REVOKE_SESSIONS_BY_EPOCH and is_refresh_token_revoked(token):
+        get_refresh_token_store().revoke(token)
+        raise AuthError('Refresh token has been revoked', code='REFRESH_TOKEN_REVOKED')
+
+
+def verify_compact_refresh_token(value: str) -> RefreshToken:
+    refreshToken, fingerprint, mac = decode_compact_refresh_token(value)
+    # Check if the cookie was issued by us, before looking the token up
+    if not constant_time_compare(mac, get_compact_refresh_token_mac(refreshToken, fingerprint)):
+        raise AuthError('Invalid refresh token', code='INVALID_REFRESH_TOKEN')
+    token = get_refresh_token_store().get_active(refreshToken)
+    # Check if the fingerprint is of the ip & user agent in db
+    if not verify_fingerprint(fingerprint, ip=token.ip, agent=token.userAgent):
+        raise AuthError('Refresh token payload not matching records', code='INVALID_TOKEN_PAYLOAD')
+    if token.issued + JWT_REFRESH_TOKEN_EXPIRATION_DELTA <= timezone.now():
+        raise AuthError('Refresh token validity expired', code='REFRESH_TOKEN_EXPIRED')
+    check_refresh_token_epoch(token)
+    return token
 
 
 def verify_refresh_token(token: str) -> RefreshToken:
+    """ Verifies a refresh token cookie in either format - a JWT, or a compact <token>.<mac> """
+    if is_compact_refresh_token(token):
+        return verify_compact_refresh_token(token)
     payload = decode_payload_from_token(token=token)
-    if "fingerprint" in payload:
+    if "fingerprint" not in payload:
+        raise AuthError('Invalid fingerprint for refresh token', code='INVALID_REFRESH_TOKEN_FINGERPRINT')
+    if "ip" in payload:
+        # signed fingerprint, with the ip & user agent in the payload, of tokens issued before hashed fingerprints
         fingerprintDecode = decode_fingerprint(payload['fingerprint'])
-        if (
+        if not (
             fingerprintDecode['ip'] == payload['ip'] and
             fingerprintDecode['agent'] == payload['userAgent']
         ):
-            token = RefreshToken.objects.get(
-                token=payload['refreshToken'],
-                revoked__isnull=True  # A refresh token is revoked if the revoked timestamp is set
-            )
-            if (
-                # Check if the ip & user agents in payload match those in db
-                token.ip == payload['ip'] and
-                token.userAgent == payload['userAgent'] and
-                # Check if the token has not expired
-                token.issued + JWT_REFRESH_TOKEN_EXPIRATION_DELTA > timezone.now()
-            ):
-                # Check if the token has not expired
-                if token.issued + JWT_REFRESH_TOKEN_EXPIRATION_DELTA > timezone.now():
-                    return token
-                raise AuthError('Refresh token validity expired', code='REFRESH_TOKEN_EXPIRED')
-            raise AuthError('Refresh token payload not matching records', code='INVALID_TOKEN_PAYLOAD')
-    raise AuthError('Invalid fingerprint for refresh token', code='INVALID_REFRESH_TOKEN_FINGERPRINT')
+            raise AuthError('Invalid fingerprint for refresh token', code='INVALID_REFRESH_TOKEN_FINGERPRINT')
+        token = get_refresh_token_store().get_active(payload['refreshToken'])
+        # Check if the ip & user agents in payload match those in db
+        matches = token.ip == payload['ip'] and token.userAgent == payload['userAgent']
+    else:
+        token = get_refresh_token_store().get_active(payload['refreshToken'])
+        # Check if the fingerprint is of the ip & user agent in db
+        matches = verify_fingerprint(payload['fingerprint'], ip=token.ip, agent=token.userAgent)
+    if not matches:
+        raise AuthError('Refresh token payload not matching records', code='INVALID_TOKEN_PAYLOAD')
+    # Check if the token has not expired
+    if token.issued + JWT_REFRESH_TOKEN_EXPIRATION_DELTA <= timezone.now():
+        raise AuthError('Refresh token validity expired', code='REFRESH_TOKEN_EXPIRED')
+    check_refresh_token_epoch(token)
+    return token
 
 
 def get_refresh_token_from_request(request: HttpRequest) -> RefreshToken:
-    if 'JWT_REFRESH_TOKEN' in request.COOKIES:
-        return verify_refresh_token(token=request.COOKIES["JWT_REFRESH_TOKEN"])
-    raise AuthError('Refresh Token Missing', code='REFRESH_TOKEN_NOT_FOUND')
+    return get_auth_context(request).get_refresh_token()
 
 
 __all__ = [
@@ -9,4 +9,5 @@ __all__ = [
     'RefreshTokenMutations',
     'SocialAuthMutations',
     'GraphQLView',
+    'AsyncGraphQLView',
 ]
@@ -1,45 +1,261 @@
+import asyncio
+import time
 from http.cookies import SimpleCookie
 
 from channels.auth import UserLazyObject
 from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
 from channels.middleware import BaseMiddleware
 from django.contrib.auth import get_user_model
 
 from django.contrib.auth.models import AnonymousUser
 
+from .sockets import SocketConnection, ExpiryWheel
+from ..auth.epoch import (
+    evict_revocation_epoch,
+    get_cached_revocation_epoch,
+    get_revocation_epoch,
+    is_payload_revoked
+)
+from ..auth.revocation import REVOCATION_GROUP, get_token_hint
 from ..auth.verify import resolve_user_from_tokens
+from ..settings import (
+    CHANNEL_USER_CACHE_SIZE,
+    CHANNEL_USER_CACHE_TTL,
+    CHANNEL_SOCKET_EXPIRY_RESOLUTION,
+    CLOSE_SOCKETS_ON_TOKEN_EXPIRY,
+    REVOCATION_CHANNEL_LAYER,
+    REVOKE_SESSIONS_BY_EPOCH,
+    JWT_EXPIRATION_DELTA
+)
+from ..utils import decode_payload_from_token
+from ..utils.cache import TTLCache
+from ..utils.refresh_token import get_refresh_token_from_cookie
 
 User = get_user_model()
 
+# users resolved for sockets keyed by their ID (as a string), so that a storm of reconnects fetches each user once
+channel_user_cache = TTLCache(maxsize=CHANNEL_USER_CACHE_SIZE)
+
+
+def get_cookie_from_headers(headers) -> SimpleCookie:
+    """ Parses the cookie headers of an ASGI scope, which are latin-1 encoded bytes """
+    cookie = SimpleCookie()
+    values = [value.decode('latin-1') for name, value in headers if name == b'cookie']
+    if values:
+        cookie.load('; '.join(values))
+    return cookie
+
+
+def get_user_by_id(userID):
+    try:
+        return User.objects.get(id=userID)
+    except User.DoesNotExist:
+        return None
+
+
+async def revalidate_socket(connection: SocketConnection) -> None:
+    """
+    Revalidates a socket whose access token has expired, with its refresh token - the socket is checked again
+    after JWT_EXPIRATION_DELTA if it is still valid, else it is closed.
+    """
+    if connection.closed:
+        return
+    if connection.refreshToken:
+        try:
+            userID = await database_sync_to_async(resolve_user_from_tokens)(refreshToken=connection.refreshToken)
+        except Exception:
+            userID = None
+        if userID is not None and str(userID) == str(connection.userID):
+            connection.deadline = time.time() + JWT_EXPIRATION_DELTA.total_seconds()
+            socket_expiry_wheel.schedule(connection)
+            return
+    await connection.close()
+
+
+socket_expiry_wheel = ExpiryWheel(onExpiry=revalidate_socket, resolution=CHANNEL_SOCKET_EXPIRY_RESOLUTION)
+
+# open authenticated sockets of the process, by the ID of their user
+user_sockets = {}
+
+
+async def handle_revocation(event: dict) -> None:
+    """
+    Evicts the user & its revocation epoch from the caches, and closes the sockets of the revoked sessions,
+    on a revocation event
+    """
+    userID = event['userID']
+    channel_user_cache.delete(userID)
+    if event['tokens'] is None:
+        evict_revocation_epoch(userID)
+    for connection in list(user_sockets.get(userID, ())):
+        if event['tokens'] is not None:
+            revoked = connection.tokenHint in event['tokens']
+        else:
+            revoked = connection.tokenHint is None or connection.tokenHint != event['exclude']
+        if revoked:
+            await connection.close()
+
+
+class RevocationListener:
+    """ Listens for revocations published by any worker on REVOCATION_CHANNEL_LAYER, in a task of the event loop """
+
+    def __init__(self):
+        self._task = None
+
+    def start(self) -> None:
+        if not REVOCATION_CHANNEL_LAYER:
+            return
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            layer = get_channel_layer(REVOCATION_CHANNEL_LAYER)
+            if layer is not None:
+                self._task = loop.create_task(self.listen(layer))
+
+    async def listen(self, layer) -> None:
+        channel = await layer.new_channel()
+        # membership of groups expires in the layer, and is renewed at half its expiry
+        renewEvery = getattr(layer, 'group_expiry', 86400) / 2
+        renewedAt = None
+        while True:
+            if renewedAt is None or time.monotonic() - renewedAt >= renewEvery:
+                await layer.group_add(REVOCATION_GROUP, channel)
+                renewedAt = time.monotonic()
+            try:
+                event = await asyncio.wait_for(layer.receive(channel), timeout=renewEvery)
+            except asyncio.TimeoutError:
+                continue
+            if event.get('type') == 'chowkidar.revoked':
+                await handle_revocation(event)
+
+
+revocation_listener = RevocationListener()
+
 
 class ChannelAuthMiddleware(BaseMiddleware):
+    """
+    Resolves scope['user'] of a socket from the token cookies, when it connects. Access tokens are verified
+    in place, and only the refresh token (when there is no valid access token) & uncached users hit the db.
+    With CLOSE_SOCKETS_ON_TOKEN_EXPIRY, authenticated sockets are revalidated once their token expires, and
+    with REVOCATION_CHANNEL_LAYER, they are closed when their session is revoked from any worker.
+    """
+
+    def __init__(self, inner):
+        super(ChannelAuthMiddleware, self).__init__(inner)
+        # users & revocation epochs being fetched, so that concurrent connects of a user share one query
+        self.pending = {}
+
+    async def __call__(self, scope, receive, send):
+        scope = dict(scope)
+        self.populate_scope(scope)
+        await self.resolve_scope(scope)
+        if not (
+            (CLOSE_SOCKETS_ON_TOKEN_EXPIRY or REVOCATION_CHANNEL_LAYER) and
+            scope.get('type') == 'websocket' and scope.get('userID')
+        ):
+            return await self.inner(scope, receive, send)
+
+        cookie = get_cookie_from_headers(scope.get('headers', []))
+        refreshToken = cookie['JWT_REFRESH_TOKEN'].value if 'JWT_REFRESH_TOKEN' in cookie else None
+        connection = SocketConnection(
+            userID=scope['userID'],
+            refreshToken=refreshToken,
+            send=send,
+            deadline=scope['tokenExpiry'],
+            tokenHint=get_token_hint(get_refresh_token_from_cookie(refreshToken)) if refreshToken else None
+        )
+
+        async def receive_message():
+            message = await receive()
+            if message['type'] == 'websocket.disconnect':
+                connection.closed = True
+                socket_expiry_wheel.cancel(connection)
+            return message
+
+        revocation_listener.start()
+        sockets = user_sockets.setdefault(str(connection.userID), set())
+        sockets.add(connection)
+        if CLOSE_SOCKETS_ON_TOKEN_EXPIRY:
+            socket_expiry_wheel.schedule(connection)
+        try:
+            return await self.inner(scope, receive_message, send)
+        finally:
+            socket_expiry_wheel.cancel(connection)
+            sockets.discard(connection)
+            if not sockets:
+                user_sockets.pop(str(connection.userID), None)
+
     def populate_scope(self, scope):
         if "user" not in scope:
             scope["user"] = UserLazyObject()
 
-    @database_sync_to_async
-    def resolve_user(self, cookie):
-        userID = resolve_user_from_tokens(
-            token=cookie['JWT_TOKEN'].value if 'JWT_TOKEN' in cookie else None,
-            refreshToken=cookie['JWT_REFRESH_TOKEN'].value if 'JWT_REFRESH_TOKEN' in cookie else None
-        )
-        if userID:
+    async def fetch_user(self, userID):
+        user = await database_sync_to_async(get_user_by_id)(userID)
+        if user is not None:
+            channel_user_cache.set(
+                str(userID), user, expiresAt=time.time() + CHANNEL_USER_CACHE_TTL.total_seconds()
+            )
+        return user
+
+    async def coalesce(self, key, fetch):
+        """ Awaits the result of fetch(), shared by concurrent calls with the same key """
+        task = self.pending.get(key)
+        if task is None:
+            task = self.pending[key] = asyncio.ensure_future(fetch())
+            task.add_done_callback(lambda t: self.pending.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def get_user(self, userID):
+        user = channel_user_cache.get(str(userID))
+        if user is not None:
+            return user
+        return await self.coalesce(('user', str(userID)), lambda: self.fetch_user(userID))
+
+    async def is_payload_revoked(self, payload: dict) -> bool:
+        """ Checks the access token against the revocation epoch of the user, reading it from the db if not cached """
+        if not REVOKE_SESSIONS_BY_EPOCH:
+            return False
+        userID = payload['userID']
+        epoch = get_cached_revocation_epoch(userID)
+        if epoch is None:
+            epoch = await self.coalesce(
+                ('epoch', str(userID)), lambda: database_sync_to_async(get_revocation_epoch)(userID)
+            )
+        return is_payload_revoked(payload, epoch)
+
+    async def resolve_user_id(self, cookie: SimpleCookie) -> tuple:
+        """ Returns the userID from the tokens, with the timestamp till which the tokens are known to be valid """
+        if 'JWT_TOKEN' in cookie:
             try:
-                return User.objects.get(id=userID)
-            except User.DoesNotExist:
+                payload = decode_payload_from_token(token=cookie['JWT_TOKEN'].value)
+                if payload.get('userID') and not await self.is_payload_revoked(payload):
+                    return payload['userID'], payload['exp']
+            except Exception:
                 pass
-        return AnonymousUser()
+        if 'JWT_REFRESH_TOKEN' in cookie:
+            userID = await database_sync_to_async(resolve_user_from_tokens)(
+                refreshToken=cookie['JWT_REFRESH_TOKEN'].value
+            )
+            if userID:
+                return userID, time.time() + JWT_EXPIRATION_DELTA.total_seconds()
+        return None, None
 
     async def resolve_scope(self, scope):
-        headers = dict(scope['headers'])
+        cookie = get_cookie_from_headers(scope.get('headers', []))
         user = AnonymousUser()
-        if b'cookie' in headers:
-            cookie = SimpleCookie()
-            cookie.load(str(headers[b'cookie']))
-            user = await self.resolve_user(cookie)
+        userID = expiry = None
+        if cookie:
+            userID, expiry = await self.resolve_user_id(cookie)
+            if userID:
+                user = await self.get_user(userID) or AnonymousUser()
         scope["user"]._wrapped = user
+        scope["userID"] = userID if user.is_authenticated else None
+        scope["tokenExpiry"] = expiry
 
 
 __all__ = [
-    'ChannelAuthMiddleware'
+    'ChannelAuthMiddleware',
+    'channel_user_cache',
+    'socket_expiry_wheel',
+    'revocation_listener'
 ]
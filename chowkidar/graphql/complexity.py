@@ -0,0 +1,134 @@
+from typing import Optional
+
+from graphql.language import ast
+from graphql.type.definition import get_named_type
+
+from ..settings import GRAPHQL_MAX_QUERY_DEPTH, GRAPHQL_MAX_QUERY_COST, GRAPHQL_FIELD_COSTS
+
+
+class QueryCost:
+    """ Depth of the deepest field & total cost of the fields selected by an operation """
+
+    def __init__(self, depth: int = 0, cost: int = 0):
+        self.depth = depth
+        self.cost = cost
+
+
+def get_field_cost(parentType, fieldName: str) -> int:
+    """ Cost hint of the field as 'Type.field' in GRAPHQL_FIELD_COSTS, else of 'field', defaults to 1 """
+    if parentType is not None:
+        hint = GRAPHQL_FIELD_COSTS.get('%s.%s' % (parentType.name, fieldName))
+        if hint is not None:
+            return hint
+    return GRAPHQL_FIELD_COSTS.get(fieldName, 1)
+
+
+def exceeds_query_cost_limits(queryCost: QueryCost) -> bool:
+    return bool(
+        (GRAPHQL_MAX_QUERY_DEPTH and queryCost.depth > GRAPHQL_MAX_QUERY_DEPTH) or
+        (GRAPHQL_MAX_QUERY_COST and queryCost.cost > GRAPHQL_MAX_QUERY_COST)
+    )
+
+
+def measure_selection_set(
+    schema, selectionSet, parentType, fragments: dict, visited: frozenset, fragmentCosts: dict
+) -> QueryCost:
+    """
+    Measures a selection set, stopping as soon as it exceeds the limits. The cost of each fragment is measured
+    once & reused by its spreads in fragmentCosts, so that nested spreads do not multiply the work.
+    """
+    result = QueryCost()
+    for selection in selectionSet.selections:
+        if isinstance(selection, ast.Field):
+            fieldName = selection.name.value
+            if fieldName == '__typename':
+                continue
+            fields = getattr(parentType, 'fields', None) or {}
+            fieldDef = fields.get(fieldName)
+            fieldType = get_named_type(fieldDef.type) if fieldDef is not None else None
+            nested = QueryCost()
+            if selection.selection_set:
+                nested = measure_selection_set(
+                    schema, selection.selection_set, fieldType, fragments, visited, fragmentCosts
+                )
+            result.depth = max(result.depth, nested.depth + 1)
+            result.cost += get_field_cost(parentType, fieldName) + nested.cost
+        else:
+            if isinstance(selection, ast.FragmentSpread):
+                fragmentName = selection.name.value
+                fragment = fragments.get(fragmentName)
+                if fragment is None or fragmentName in visited:
+                    continue
+                nested = fragmentCosts.get(fragmentName)
+                if nested is None:
+                    fragmentType = schema.get_type(fragment.type_condition.name.value)
+                    nested = fragmentCosts[fragmentName] = measure_selection_set(
+                        schema, fragment.selection_set, fragmentType, fragments, visited | {fragmentName},
+                        fragmentCosts
+                    )
+            else:
+                fragmentType = (
+                    schema.get_type(selection.type_condition.name.value) if selection.type_condition
+                    else parentType
+                )
+                nested = measure_selection_set(
+                    schema, selection.selection_set, fragmentType, fragments, visited, fragmentCosts
+                )
+            result.depth = max(result.depth, nested.depth)
+            result.cost += nested.cost
+        if exceeds_query_cost_limits(result):
+            break
+    return result
+
+
+def analyze_query_cost(schema, document_ast, operation_name: str = None) -> Optional[QueryCost]:
+    """ Measures the cost of the operation of the document, None if the operation is not found """
+    fragments = {}
+    operations = []
+    for definition in document_ast.definitions:
+        if isinstance(definition, ast.FragmentDefinition):
+            fragments[definition.name.value] = definition
+        elif isinstance(definition, ast.OperationDefinition):
+            operations.append(definition)
+
+    if operation_name:
+        operations = [o for o in operations if o.name and o.name.value == operation_name]
+    if len(operations) != 1:
+        return None
+    operation = operations[0]
+    rootType = {
+        'query': schema.get_query_type,
+        'mutation': schema.get_mutation_type,
+        'subscription': schema.get_subscription_type
+    }[operation.operation]()
+    return measure_selection_set(schema, operation.selection_set, rootType, fragments, frozenset(), {})
+
+
+def is_query_cost_limited() -> bool:
+    return bool(GRAPHQL_MAX_QUERY_DEPTH or GRAPHQL_MAX_QUERY_COST)
+
+
+def get_query_cost_error(queryCost: Optional[QueryCost]) -> Optional[Exception]:
+    """ Returns the error to reject the operation with, if it exceeds the maximum depth or cost """
+    from .view import ResponseError
+    if queryCost is None:
+        return None
+    if GRAPHQL_MAX_QUERY_DEPTH and queryCost.depth > GRAPHQL_MAX_QUERY_DEPTH:
+        return ResponseError(
+            'Query is too deep', code='QUERY_TOO_DEEP',
+            params={'depth': queryCost.depth, 'max_depth': GRAPHQL_MAX_QUERY_DEPTH}
+        )
+    if GRAPHQL_MAX_QUERY_COST and queryCost.cost > GRAPHQL_MAX_QUERY_COST:
+        return ResponseError(
+            'Query is too complex', code='QUERY_TOO_COMPLEX',
+            params={'cost': queryCost.cost, 'max_cost': GRAPHQL_MAX_QUERY_COST}
+        )
+    return None
+
+
+__all__ = [
+    'QueryCost',
+    'analyze_query_cost',
+    'is_query_cost_limited',
+    'get_query_cost_error'
+]
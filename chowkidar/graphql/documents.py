@@ -0,0 +1,114 @@
+import hashlib
+import json
+import math
+from typing import Optional
+
+from django.utils.functional import cached_property
+from django.utils.module_loading import import_string
+
+from graphql.backend.base import GraphQLDocument
+from graphql.execution import ExecutionResult, execute
+from graphql.language.parser import parse
+from graphql.validation import validate
+
+from .complexity import QueryCost, analyze_query_cost
+from ..settings import GRAPHQL_DOCUMENT_CACHE_SIZE, GRAPHQL_PERSISTED_QUERIES
+from ..utils.cache import TTLCache
+
+
+def hash_query(query: str) -> str:
+    """ SHA-256 hex digest of a query, the key by which documents are cached & persisted queries are registered """
+    return hashlib.sha256(query.encode('utf-8')).hexdigest()
+
+
+class ValidatedDocument(GraphQLDocument):
+    """
+    A document parsed & validated once against the schema. Executing it does not validate it again,
+    so that it can be cached & executed for every request with the same query.
+    """
+
+    def __init__(self, schema, document_string: str, document_ast):
+        self.errors = validate(schema, document_ast)
+        self.queryCosts = {}
+        super(ValidatedDocument, self).__init__(
+            schema=schema,
+            document_string=document_string,
+            document_ast=document_ast,
+            execute=self.execute_validated
+        )
+
+    def execute_validated(self, *args, **kwargs) -> ExecutionResult:
+        if self.errors:
+            return ExecutionResult(errors=self.errors, invalid=True)
+        return execute(self.schema, self.document_ast, *args, **kwargs)
+
+    def get_query_cost(self, operation_name: str = None) -> Optional[QueryCost]:
+        """ Cost of the operation, measured once per operation of the document """
+        if operation_name not in self.queryCosts:
+            self.queryCosts[operation_name] = analyze_query_cost(self.schema, self.document_ast, operation_name)
+        return self.queryCosts[operation_name]
+
+    @cached_property
+    def selectsProtectedFields(self) -> bool:
+        from .view import selects_protected_fields
+        return selects_protected_fields(self.document_ast)
+
+
+# documents keyed by (schema, hash of the query), shared by all requests of the process
+document_cache = TTLCache(maxsize=GRAPHQL_DOCUMENT_CACHE_SIZE)
+
+
+def get_document(schema, query: str, queryHash: str = None) -> ValidatedDocument:
+    """ Returns the validated document of the query from the cache, parsing & validating it on a miss """
+    key = (schema, queryHash or hash_query(query))
+    document = document_cache.get(key)
+    if document is None:
+        document = ValidatedDocument(schema, query, parse(query))
+        document_cache.set(key, document, expiresAt=math.inf)
+    return document
+
+
+def load_persisted_queries() -> dict:
+    """
+    Loads the allowlist of persisted queries as a dict of their hash to the query, from GRAPHQL_PERSISTED_QUERIES -
+    a list of queries or a dict of hash to query, or a dotted path to either.
+    """
+    queries = GRAPHQL_PERSISTED_QUERIES
+    if not queries:
+        return {}
+    if isinstance(queries, str):
+        queries = import_string(queries)
+    if isinstance(queries, dict):
+        for queryHash, query in queries.items():
+            if hash_query(query) != queryHash:
+                raise ValueError('Hash of the persisted query does not match %s' % queryHash)
+        return dict(queries)
+    return dict((hash_query(query), query) for query in queries)
+
+
+persisted_queries = load_persisted_queries()
+
+
+def get_persisted_query_hash(extensions) -> Optional[str]:
+    """ Hash of the persisted query requested with the extensions of the request, as {"persistedQuery": {...}} """
+    if isinstance(extensions, str):
+        try:
+            extensions = json.loads(extensions)
+        except ValueError:
+            return None
+    try:
+        queryHash = extensions['persistedQuery']['sha256Hash']
+    except (KeyError, TypeError):
+        return None
+    return queryHash if isinstance(queryHash, str) else None
+
+
+__all__ = [
+    'ValidatedDocument',
+    'document_cache',
+    'get_document',
+    'hash_query',
+    'persisted_queries',
+    'load_persisted_queries',
+    'get_persisted_query_hash'
+]
@@ -1,10 +1,16 @@
 import graphene
 from django.utils import timezone
 
-from ..models import RefreshToken
+from ..store import get_refresh_token_store
 from .decorators import login_required, fingerprint_required
 from .exceptions import APIException
 from ..auth import authenticate_user_from_credentials
+from ..auth.context import get_auth_context
+from ..auth.epoch import revoke_sessions_by_epoch, is_refresh_token_revoked
+from ..auth.ratelimit import rate_limited, get_credential_identity
+from ..auth.registry import issues_session, ends_session
+from ..auth.revocation import publish_revocation
+from ..auth.singleflight import forget_refreshed_tokens_of_user
 from ..auth.verify import verify_refresh_token, get_refresh_token_from_request
 from ..auth.handler import generate_refresh_token_cookie_data_from_userID
 from ..utils import AuthError
@@ -13,18 +19,20 @@ from ..settings import (
     REVOKE_OTHER_TOKENS_ON_AUTH_FOR_USER,
     ALLOW_USER_TO_LOGIN_ON_AUTH,
     JWT_REFRESH_TOKEN_EXPIRATION_DELTA,
+    REVOKE_SESSIONS_BY_EPOCH,
     CHOWKIDAR_GAUTH_CALLBACK
 )
 from ..utils.settings import import_string
 
 
 def revoke_other_tokens(userID, request) -> None:
-    refreshToken = request.COOKIES["JWT_REFRESH_TOKEN"] if 'JWT_REFRESH_TOKEN' in request.COOKIES else None
-    RefreshToken.objects.filter(
-        user_id=userID, revoked__isnull=True
-    ).exclude(token=refreshToken).update(
-        revoked=timezone.now()
-    )
+    refreshToken = get_auth_context(request).refreshToken
+    if REVOKE_SESSIONS_BY_EPOCH:
+        revoke_sessions_by_epoch(userID=userID, exclude=refreshToken)
+    else:
+        get_refresh_token_store().revoke_others(userID=userID, exclude=refreshToken)
+    forget_refreshed_tokens_of_user(userID)
+    publish_revocation(userID=userID, exclude=refreshToken.get_token() if refreshToken is not None else None)
 
 
 class UserSession(graphene.ObjectType):
@@ -39,6 +47,7 @@ class UserSession(graphene.ObjectType):
         return (
             self.revoked is None
             and self.issued + JWT_REFRESH_TOKEN_EXPIRATION_DELTA > timezone.now()
+            and not (REVOKE_SESSIONS_BY_EPOCH and is_refresh_token_revoked(self))
         )
 
     def resolve_issued(self, info):
@@ -62,9 +71,7 @@ class AuthQueries(graphene.ObjectType):
 
     @fingerprint_required
     def resolve_mySessions(self, info, offset=0, count=10):
-        return RefreshToken.objects.filter(
-            user_id=info.context.userID
-        ).order_by('-revoked', '-issued')[offset:offset+count]
+        return get_refresh_token_store().list_for_user(userID=info.context.userID, offset=offset, count=count)
 
 
 class AuthenticatedUser(graphene.ObjectType):
@@ -89,6 +96,8 @@ class AuthenticateUser(graphene.Mutation, description='Authenticate a user using
 
     Output = GenerateTokenResponse
 
+    @issues_session
+    @rate_limited('authenticate', identity=get_credential_identity)
     def mutate(self, info, password, email=None, username=None):
         try:
             user = authenticate_user_from_credentials(password=password, email=email, username=username)
@@ -108,6 +117,7 @@ class LogoutUser(graphene.Mutation, description='Logout a user'):
 
     Output = graphene.Boolean
 
+    @ends_session
     @login_required
     def mutate(self, info):
         # functions are handled in respond_handling_authentication()
@@ -123,14 +133,14 @@ class RevokeToken(graphene.Mutation, description='Revoke a given refresh token o
     @fingerprint_required
     def mutate(self, info, token):
         try:
-            RefreshToken.objects.get(
-                user_id=info.context.userID, token=token
-            ).delete()
-            return True
-        except RefreshToken.DoesNotExist:
-            raise APIException(message='Invalid Refresh Token', code='INVALID_TOKEN')
+            revoked = get_refresh_token_store().revoke_for_user(userID=info.context.userID, token=token)
         except Exception:
             raise APIException(message='Could not revoke Refresh Token', code='FAILED')
+        if not revoked:
+            raise APIException(message='Invalid Refresh Token', code='INVALID_TOKEN')
+        forget_refreshed_tokens_of_user(info.context.userID)
+        publish_revocation(userID=info.context.userID, tokens=[token])
+        return True
 
 
 class RevokeOtherTokens(graphene.Mutation,  description='Revoke all other refresh tokens of user except the current one'):
@@ -157,6 +167,8 @@ class SocialAuth(graphene.Mutation, description='Authenticate a user using socia
 
     Output = GenerateSocialTokenResponse
 
+    @issues_session
+    @rate_limited('social-auth')
     def mutate(self, info, accessToken, provider):
         try:
             from social_core.exceptions import MissingBackend
@@ -191,6 +203,8 @@ class GAuth(graphene.Mutation, description='Authenticate a user using google ide
 
     Output = GenerateSocialTokenResponse
 
+    @issues_session
+    @rate_limited('gauth')
     def mutate(self, info, accessToken):
         try:
             from google.oauth2 import id_token
@@ -250,6 +264,7 @@ class GetRefreshToken(graphene.Mutation, description='Authenticate a user using
 
     Output = RefreshTokenResponse
 
+    @rate_limited('refresh-token', identity=get_credential_identity)
     def mutate(self, info, password=None, email=None, username=None):
         try:
             request = info.context
@@ -277,6 +292,7 @@ class SetRefreshToken(graphene.Mutation, description='Authenticate a user using
 
     Output = GenerateTokenResponse
 
+    @issues_session
     def mutate(self, info, token):
         try:
             from datetime import timedelta
@@ -0,0 +1,96 @@
+import asyncio
+import heapq
+import math
+import time
+
+
+class SocketConnection:
+    """ An authenticated socket, with the unix timestamp by which its auth has to be revalidated """
+
+    def __init__(self, userID, refreshToken: str, send, deadline: float, tokenHint: str = None):
+        self.userID = userID
+        self.refreshToken = refreshToken
+        # hint of the refresh token of the session, to match revocations of it
+        self.tokenHint = tokenHint
+        self.send = send
+        self.deadline = deadline
+        self.slot = None
+        self.closed = False
+
+    async def close(self, code: int = 4001) -> None:
+        if not self.closed:
+            self.closed = True
+            await self.send({'type': 'websocket.close', 'code': code})
+
+
+class ExpiryWheel:
+    """
+    Timer wheel of sockets, in slots of resolution seconds by their deadline. A single task of the event loop
+    sleeps till the earliest slot which has sockets, and hands them to onExpiry - so that the cost is of the
+    sockets which expire, and not of every open socket.
+    """
+
+    def __init__(self, onExpiry, resolution: float = 1.0):
+        self.onExpiry = onExpiry
+        self.resolution = resolution
+        self.slots = {}
+        self.heap = []
+        self._task = None
+        self._wakeup = None
+
+    def schedule(self, connection: SocketConnection) -> None:
+        self.cancel(connection)
+        slot = math.ceil(connection.deadline / self.resolution)
+        connections = self.slots.get(slot)
+        if connections is None:
+            connections = self.slots[slot] = set()
+            heapq.heappush(self.heap, slot)
+        connections.add(connection)
+        connection.slot = slot
+
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self.run())
+        elif self.heap[0] == slot:
+            # wake the task up, to sleep till this earlier slot instead
+            self._wakeup.set()
+
+    def cancel(self, connection: SocketConnection) -> None:
+        if connection.slot is not None:
+            connections = self.slots.get(connection.slot)
+            if connections is not None:
+                connections.discard(connection)
+                if not connections and self.heap and self.heap[0] == connection.slot and self._wakeup is not None:
+                    # wake the task up, to sleep till the next slot instead or to stop when none are left
+                    self._wakeup.set()
+            connection.slot = None
+
+    async def run(self) -> None:
+        while self.heap:
+            slot = self.heap[0]
+            if not self.slots.get(slot):
+                heapq.heappop(self.heap)
+                self.slots.pop(slot, None)
+                continue
+            delay = slot * self.resolution - time.time()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heapq.heappop(self.heap)
+            for connection in self.slots.pop(slot):
+                connection.slot = None
+                asyncio.ensure_future(self.onExpiry(connection))
+
+    def __len__(self):
+        return sum(len(connections) for connections in self.slots.values())
+
+
+__all__ = [
+    'SocketConnection',
+    'ExpiryWheel'
+]
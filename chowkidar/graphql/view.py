@@ -1,21 +1,42 @@
 import json
+from functools import update_wrapper
 from typing import Union
 
+from asgiref.sync import sync_to_async
+from django.middleware.csrf import get_token
 from django.shortcuts import render
-from django.utils.decorators import method_decorator
+from django.utils.decorators import classonlymethod, method_decorator
 from django.views.decorators.csrf import ensure_csrf_cookie
-from django.http.response import HttpResponseNotAllowed
+from django.http.response import HttpResponseNotAllowed, HttpResponseBadRequest
 
+from graphql.backend.core import GraphQLCoreBackend
+from graphql.execution import ExecutionResult
+from graphql.language import ast
 from graphql.error import GraphQLSyntaxError
 from graphql.error import GraphQLError
 from graphql.error.located_error import GraphQLLocatedError
-from graphene_django.views import GraphQLView as BaseGraphQLView
+from graphene_django.views import GraphQLView as BaseGraphQLView, HttpError as BaseHttpError
 
 from graphene.utils.str_converters import to_snake_case, to_camel_case
 
 from .files import place_files_in_operations
-from ..auth import respond_handling_authentication
-from ..settings import PROTECT_GRAPHQL
+# chowkidar.auth has to be loaded before chowkidar.utils, whose refresh_token module imports chowkidar.auth
+from ..auth import respond_handling_authentication, respond_handling_authentication_async, ChowkidarAuthMiddleware
+from ..auth.middleware import (
+    IntrospectionProtectionMiddleware,
+    PROTECTED_FIELDS,
+    is_introspection_allowed,
+    resolve_authentication
+)
+from ..auth.context import get_auth_context, get_auth_context_async
+from .complexity import analyze_query_cost, get_query_cost_error, is_query_cost_limited
+from .documents import ValidatedDocument, get_document, get_persisted_query_hash, hash_query, persisted_queries
+from ..settings import (
+    PROTECT_GRAPHQL,
+    GRAPHQL_MAX_BATCH_SIZE,
+    GRAPHQL_DOCUMENT_CACHE_SIZE,
+    GRAPHQL_PERSISTED_QUERIES_ONLY
+)
 
 
 class ResponseError(Exception):
@@ -38,6 +59,21 @@ def dict_key_to_camel_case(d: dict):
     return dict((encode_key(k), v) for k, v in d.items())
 
 
+def selects_protected_fields(node) -> bool:
+    """ Checks if any selection within the document (or node) is a field protected from introspection """
+    if isinstance(node, ast.Document):
+        return any(selects_protected_fields(definition) for definition in node.definitions)
+    selectionSet = getattr(node, 'selection_set', None)
+    if selectionSet is None:
+        return False
+    for selection in selectionSet.selections:
+        if isinstance(selection, ast.Field) and selection.name.value in PROTECTED_FIELDS:
+            return True
+        if selects_protected_fields(selection):
+            return True
+    return False
+
+
 class HttpError(Exception):
     def __init__(self, response, message=None, *args, **kwargs):
         self.response = response
@@ -56,6 +92,12 @@ class GraphQLView(BaseGraphQLView):
     batch = False
     subscription_path = None
 
+    def __init__(self, *args, **kwargs):
+        super(GraphQLView, self).__init__(*args, **kwargs)
+        # auth is resolved once per operation by the view, rather than on every field by the middleware
+        if self.middleware:
+            self.middleware = [m for m in self.middleware if not isinstance(m, ChowkidarAuthMiddleware)]
+
     @method_decorator(ensure_csrf_cookie)
     def dispatch(self, request, *args, **kwargs):
         if request.method.lower() not in ("get", "post", "options"):
@@ -78,20 +120,27 @@ class GraphQLView(BaseGraphQLView):
                 )
             )
         try:
-            if self.batch:
-                raise HttpError(
-                    HttpResponseNotAllowed("Batch queries not supported")
-                )
             data = self.parse_body(request)
-            result, status_code = self.get_response(request, data)
-            return respond_handling_authentication(status_code=status_code, result=json.loads(result), request=request)
-        except HttpError as e:
+            if self.batch:
+                result, status_code = self.get_batch_response(request, data)
+            else:
+                result, status_code = self.get_response(request, data)
             return respond_handling_authentication(
-                status_code=e.response.code,
+                status_code=status_code, result=result, request=request, pretty=self.is_pretty(request)
+            )
+        # graphene_django raises its own HttpError, for bodies which are not valid JSON queries
+        except (HttpError, BaseHttpError) as e:
+            return respond_handling_authentication(
+                status_code=e.response.status_code,
                 result={"errors": [self.format_error(e)]},
-                request=request
+                request=request,
+                pretty=self.is_pretty(request)
             )
 
+    def is_pretty(self, request) -> bool:
+        """ Whether the response is to be indented, through the pretty option of the view or ?pretty """
+        return bool(self.pretty or request.GET.get("pretty"))
+
     def parse_body(self, request):
         """Handle multipart request spec for multipart/form-data"""
         content_type = self.get_content_type(request)
@@ -105,6 +154,126 @@ class GraphQLView(BaseGraphQLView):
             )
         return super(GraphQLView, self).parse_body(request)
 
+    def get_response(self, request, data, show_graphiql=False):
+        """ Returns the result of the operation as a dict, to be serialized only once while responding """
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+
+        execution_result = self.execute_graphql_request(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+
+        status_code = 200
+        if execution_result:
+            response = {}
+            if execution_result.errors:
+                response["errors"] = [self.format_error(e) for e in execution_result.errors]
+            if execution_result.invalid:
+                status_code = 400
+            else:
+                response["data"] = execution_result.data
+            if self.batch:
+                response["id"] = id
+                response["status"] = status_code
+            return response, status_code
+        return None, status_code
+
+    def get_batch_response(self, request, data):
+        """ Executes a batch of operations sharing one auth context, returns their results & the highest status """
+        if len(data) > GRAPHQL_MAX_BATCH_SIZE:
+            raise HttpError(HttpResponseBadRequest(
+                "Batch should not have more than {} operations.".format(GRAPHQL_MAX_BATCH_SIZE)
+            ))
+        if not all(isinstance(entry, dict) for entry in data):
+            raise HttpError(HttpResponseBadRequest("Each operation of a batch should be a JSON object."))
+        context = get_auth_context(request)
+        results = []
+        status_code = 200
+        for index, entry in enumerate(data):
+            context.operationIndex = index
+            result, entryStatusCode = self.get_response(request, entry)
+            results.append(result)
+            status_code = max(status_code, entryStatusCode)
+        context.operationIndex = None
+        return results, status_code
+
+    def get_document(self, request, query: str):
+        """
+        Returns the document of the query, parsed & validated once and cached by the hash of the query when
+        the default backend is used. Other backends parse & validate it on their own.
+        """
+        backend = self.get_backend(request)
+        if GRAPHQL_DOCUMENT_CACHE_SIZE and isinstance(backend, GraphQLCoreBackend):
+            return get_document(self.schema, query)
+        return backend.document_from_string(self.schema, query)
+
+    def execute_graphql_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        queryHash = get_persisted_query_hash(request.GET.get('extensions') or data.get('extensions'))
+        if queryHash is not None or (query and GRAPHQL_PERSISTED_QUERIES_ONLY):
+            persistedQuery = persisted_queries.get(queryHash or hash_query(query))
+            if persistedQuery is not None:
+                query = persistedQuery
+            elif GRAPHQL_PERSISTED_QUERIES_ONLY or not query:
+                return ExecutionResult(errors=[
+                    ResponseError('Persisted query not found', code='PERSISTED_QUERY_NOT_FOUND')
+                ], invalid=True)
+
+        if not query:
+            if show_graphiql:
+                return None
+            raise HttpError(HttpResponseBadRequest("Must provide query string."))
+
+        try:
+            document = self.get_document(request, query)
+        except Exception as e:
+            return ExecutionResult(errors=[e], invalid=True)
+
+        if request.method.lower() == "get":
+            operation_type = document.get_operation_type(operation_name)
+            if operation_type and operation_type != "query":
+                if show_graphiql:
+                    return None
+                raise HttpError(
+                    HttpResponseNotAllowed(
+                        ["POST"],
+                        "Can only perform a {} operation from a POST request.".format(operation_type),
+                    )
+                )
+
+        if is_query_cost_limited():
+            queryCost = (
+                document.get_query_cost(operation_name) if isinstance(document, ValidatedDocument)
+                else analyze_query_cost(self.schema, document.document_ast, operation_name)
+            )
+            error = get_query_cost_error(queryCost)
+            if error is not None:
+                return ExecutionResult(errors=[error], invalid=True)
+
+        resolve_authentication(request)
+        middleware = self.get_middleware(request)
+        if not is_introspection_allowed(request) and (
+            document.selectsProtectedFields if isinstance(document, ValidatedDocument)
+            else selects_protected_fields(document.document_ast)
+        ):
+            middleware = list(middleware or []) + [IntrospectionProtectionMiddleware()]
+
+        try:
+            extra_options = {}
+            if self.executor:
+                # executor is not a valid argument in all backends
+                extra_options["executor"] = self.executor
+            return document.execute(
+                root=self.get_root_value(request),
+                variables=variables,
+                operation_name=operation_name,
+                context=self.get_context(request),
+                middleware=middleware,
+                **extra_options
+            )
+        except Exception as e:
+            return ExecutionResult(errors=[e], invalid=True)
+
     @staticmethod
     def encode_params(params):
         if params is None:
@@ -132,6 +301,8 @@ class GraphQLView(BaseGraphQLView):
     def format_error(self, error):
         if isinstance(error, GraphQLLocatedError):
             return self.format_response_error(error.original_error)
+        if isinstance(error, ResponseError):
+            return self.format_response_error(error)
         if isinstance(error, GraphQLSyntaxError):
             if PROTECT_GRAPHQL:
                 return {"message": "Invalid Request", "code": "SYNTAX_ERROR"}
@@ -154,6 +325,67 @@ class GraphQLView(BaseGraphQLView):
         }
 
 
+class AsyncGraphQLView(GraphQLView):
+    """
+    GraphQLView for ASGI deployments, which handles requests as a coroutine instead of in a thread.
+    The auth context is resolved in a thread (hitting the db only to verify the refresh token when there is no
+    valid access token), as are the execution of the operation (resolvers of graphene 2 are sync) & issuing,
+    ending or refreshing sessions while responding.
+    """
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        view = super(AsyncGraphQLView, cls).as_view(**initkwargs)
+
+        async def async_view(request, *args, **kwargs):
+            return await view(request, *args, **kwargs)
+
+        # view_class, view_initkwargs & attributes like csrf_exempt are carried over
+        update_wrapper(async_view, view)
+        return async_view
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method.lower() not in ("get", "post", "options"):
+            raise HttpError(
+                HttpResponseNotAllowed(
+                    ["GET", "POST", "OPTIONS"], "Only supports GET, POST and OPTIONS requests."
+                )
+            )
+        # ensure_csrf_cookie cannot decorate a coroutine, the csrf middleware sets the cookie once it is used
+        get_token(request)
+        if request.method.lower() == "get" and self.can_display_graphiql(request, self.parse_body(request)):
+            allowGraphiQL = self.graphiql and not PROTECT_GRAPHQL
+            if not allowGraphiQL:
+                allowGraphiQL = await sync_to_async(lambda: bool(request.user and request.user.is_staff))()
+            if allowGraphiQL:
+                return render(request, "graphiql/graphiql.html")
+        if PROTECT_GRAPHQL and request.method.lower() not in "post":
+            raise HttpError(
+                HttpResponseNotAllowed(
+                    ["POST"], "Only supports POST requests."
+                )
+            )
+        try:
+            data = self.parse_body(request)
+            await get_auth_context_async(request)
+            if self.batch:
+                result, status_code = await sync_to_async(self.get_batch_response)(request, data)
+            else:
+                result, status_code = await sync_to_async(self.get_response)(request, data)
+            return await respond_handling_authentication_async(
+                status_code=status_code, result=result, request=request, pretty=self.is_pretty(request)
+            )
+        # graphene_django raises its own HttpError, for bodies which are not valid JSON queries
+        except (HttpError, BaseHttpError) as e:
+            return await respond_handling_authentication_async(
+                status_code=e.response.status_code,
+                result={"errors": [self.format_error(e)]},
+                request=request,
+                pretty=self.is_pretty(request)
+            )
+
+
 __all__ = [
-    'GraphQLView'
+    'GraphQLView',
+    'AsyncGraphQLView'
 ]
@@ -0,0 +1,61 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ...settings import (
+    JWT_REFRESH_TOKEN_EXPIRATION_DELTA,
+    PURGE_REVOKED_REFRESH_TOKENS_AFTER,
+    PURGE_EXPIRED_REFRESH_TOKENS_AFTER
+)
+from ...store import get_refresh_token_store, ModelRefreshTokenStore
+
+
+class Command(BaseCommand):
+    help = 'Deletes (or archives) revoked & expired refresh tokens in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--revoked-days', type=float, default=PURGE_REVOKED_REFRESH_TOKENS_AFTER.total_seconds() / 86400,
+            help='Purge tokens revoked more than these many days ago'
+        )
+        parser.add_argument(
+            '--expired-days', type=float, default=PURGE_EXPIRED_REFRESH_TOKENS_AFTER.total_seconds() / 86400,
+            help='Purge tokens expired more than these many days ago'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of tokens purged per batch')
+        parser.add_argument('--sleep', type=float, default=0, help='Seconds to wait between batches')
+        parser.add_argument('--archive', action='store_true', help='Move purged tokens to ArchivedRefreshToken')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the tokens that would be purged')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        revokedBefore = now - timedelta(days=options['revoked_days'])
+        issuedBefore = now - JWT_REFRESH_TOKEN_EXPIRATION_DELTA - timedelta(days=options['expired_days'])
+
+        store = get_refresh_token_store()
+        if not isinstance(store, ModelRefreshTokenStore):
+            if options['dry_run']:
+                self.stdout.write('Dry run is not supported by %s' % store.__class__.__name__)
+                return
+            count = store.purge(revokedBefore=revokedBefore, issuedBefore=issuedBefore)
+            self.stdout.write('Purged %d refresh tokens' % count)
+            return
+
+        if options['dry_run']:
+            count = store.get_purgeable(revokedBefore=revokedBefore, issuedBefore=issuedBefore).count()
+            self.stdout.write('%d refresh tokens would be purged' % count)
+            return
+
+        count = 0
+        for batchCount in store.purge_in_batches(
+            revokedBefore=revokedBefore, issuedBefore=issuedBefore,
+            batchSize=options['batch_size'], archive=options['archive']
+        ):
+            count += batchCount
+            if options['verbosity'] > 1:
+                self.stdout.write('Purged %d refresh tokens so far' % count)
+            if options['sleep']:
+                time.sleep(options['sleep'])
+        self.stdout.write('%s %d refresh tokens' % ('Archived' if options['archive'] else 'Purged', count))
@@ -0,0 +1,50 @@
+# Generated by Django 3.2.25 on 2026-10-17 09:16
+
+import hashlib
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def backfill_digests(apps, schema_editor):
+    """ Stores the digest of existing tokens in batches keyed by the primary key, to avoid long locks """
+    RefreshToken = apps.get_model('chowkidar', 'RefreshToken')
+    lastID = 0
+    while True:
+        batch = list(
+            RefreshToken.objects.filter(id__gt=lastID, digest__isnull=True).order_by('id').only('id', 'token')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        for rt in batch:
+            rt.digest = hashlib.sha256(rt.token.encode()).digest()
+        RefreshToken.objects.bulk_update(batch, ['digest'])
+        lastID = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    # each batch of the backfill is committed on its own
+    atomic = False
+
+    dependencies = [
+        ('chowkidar', '0002_auto_20210111_1922'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='refreshtoken',
+            name='digest',
+            field=models.BinaryField(max_length=32, null=True),
+        ),
+        migrations.RunPython(backfill_digests, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='refreshtoken',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='refreshtoken',
+            constraint=models.UniqueConstraint(condition=models.Q(('revoked__isnull', True)), fields=('digest',), name='chowkidar_refreshtoken_active_digest'),
+        ),
+    ]
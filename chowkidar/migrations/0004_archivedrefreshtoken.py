@@ -0,0 +1,30 @@
+# Generated by Django 3.2.25 on 2026-10-17 09:20
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('chowkidar', '0003_refreshtoken_digest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedRefreshToken',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('token', models.CharField(editable=False, max_length=255)),
+                ('digest', models.BinaryField(max_length=32, null=True)),
+                ('issued', models.DateTimeField(editable=False)),
+                ('revoked', models.DateTimeField(blank=True, null=True)),
+                ('ip', models.GenericIPAddressField(blank=True, null=True)),
+                ('userAgent', models.CharField(blank=True, max_length=255, null=True)),
+                ('archived', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='archived_refresh_token', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
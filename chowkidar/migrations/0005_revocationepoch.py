@@ -0,0 +1,24 @@
+# Generated by Django 3.2.25 on 2026-10-17 09:36
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('chowkidar', '0004_archivedrefreshtoken'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevocationEpoch',
+            fields=[
+                ('user', models.OneToOneField(editable=False, on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='revocation_epoch', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('notBefore', models.DateTimeField()),
+                ('excludeDigest', models.BinaryField(max_length=32, null=True)),
+            ],
+        ),
+    ]
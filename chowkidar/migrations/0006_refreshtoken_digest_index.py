@@ -0,0 +1,41 @@
+from django.db import migrations
+
+INDEX_NAME = 'chowkidar_refreshtoken_digest_idx'
+
+
+def create_digest_index(apps, schema_editor):
+    """
+    Indexes the digest on backends which ignore the conditional unique constraint on it, like MySQL - where the
+    digest is a BLOB, and so is indexed by a prefix of its length
+    """
+    connection = schema_editor.connection
+    if connection.features.supports_partial_indexes or connection.vendor != 'mysql':
+        return
+    RefreshToken = apps.get_model('chowkidar', 'RefreshToken')
+    schema_editor.execute('CREATE INDEX %s ON %s (%s(32))' % (
+        schema_editor.quote_name(INDEX_NAME),
+        schema_editor.quote_name(RefreshToken._meta.db_table),
+        schema_editor.quote_name('digest')
+    ))
+
+
+def drop_digest_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.features.supports_partial_indexes or connection.vendor != 'mysql':
+        return
+    RefreshToken = apps.get_model('chowkidar', 'RefreshToken')
+    schema_editor.execute('DROP INDEX %s ON %s' % (
+        schema_editor.quote_name(INDEX_NAME),
+        schema_editor.quote_name(RefreshToken._meta.db_table)
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chowkidar', '0005_revocationepoch'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_digest_index, drop_digest_index),
+    ]
@@ -1,9 +1,20 @@
 import binascii
+import hashlib
 import os
 
 from django.db import models
 from django.conf import settings
-from chowkidar.settings import JWT_REFRESH_TOKEN_N_BYTES
+from chowkidar.settings import JWT_REFRESH_TOKEN_N_BYTES, STORE_REFRESH_TOKEN_DIGEST_ONLY
+
+# length of the token prefix stored in place of the token, when only its digest is stored
+TOKEN_HINT_LENGTH = 12
+
+
+class RefreshTokenQuerySet(models.QuerySet):
+
+    def filter_by_token(self, token: str):
+        """ Filters by the digest of the token, which is uniquely indexed for active tokens """
+        return self.filter(digest=AbstractRefreshToken.digest_token(token))
 
 
 class AbstractRefreshToken(models.Model):
@@ -15,19 +26,30 @@ class AbstractRefreshToken(models.Model):
         editable=False
     )
     token = models.CharField(max_length=255, editable=False)
+    # SHA-256 digest of the token, used for looking up the token
+    digest = models.BinaryField(max_length=32, null=True, editable=False)
     issued = models.DateTimeField(auto_now_add=True, editable=False)
     revoked = models.DateTimeField(null=True, blank=True)
     ip = models.GenericIPAddressField(null=True, blank=True)
     userAgent = models.CharField(max_length=255, null=True, blank=True)
 
+    objects = RefreshTokenQuerySet.as_manager()
+
     @staticmethod
     def generate_token():
         """ Generates a refresh token """
         return binascii.hexlify(os.urandom(JWT_REFRESH_TOKEN_N_BYTES)).decode()
 
+    @staticmethod
+    def digest_token(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
     def save(self, *args, **kwargs):
         if not self.token:
-            self.token = self._cached_token = self.generate_token()
+            token = self._cached_token = self.generate_token()
+            self.digest = self.digest_token(token)
+            # only a non-usable prefix of the token is kept, if the token is not to be stored
+            self.token = token[:TOKEN_HINT_LENGTH] if STORE_REFRESH_TOKEN_DIGEST_ONLY else token
         super().save(*args, **kwargs)
 
     def get_token(self):
@@ -37,8 +59,15 @@ class AbstractRefreshToken(models.Model):
 
     class Meta:
         abstract = True
-        # (token, revoked) ensures uniqueness of non-revoked tokens (since revoked=null)
-        unique_together = ('token', 'revoked')
+        constraints = [
+            # ensures uniqueness of non-revoked tokens, and indexes only them for lookups. Backends which ignore
+            # conditional constraints (models.W036), like MySQL, get a plain index on the digest in migration 0006
+            models.UniqueConstraint(
+                fields=['digest'],
+                condition=models.Q(revoked__isnull=True),
+                name='%(app_label)s_%(class)s_active_digest'
+            )
+        ]
 
     def __str__(self):
         return self.token
@@ -48,6 +77,48 @@ class RefreshToken(AbstractRefreshToken):
     """ RefreshToken default model """
 
 
+class ArchivedRefreshToken(models.Model):
+    """ Refresh tokens moved out of RefreshToken by the chowkidar_purge command """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='archived_refresh_token',
+        editable=False
+    )
+    token = models.CharField(max_length=255, editable=False)
+    digest = models.BinaryField(max_length=32, null=True, editable=False)
+    issued = models.DateTimeField(editable=False)
+    revoked = models.DateTimeField(null=True, blank=True)
+    ip = models.GenericIPAddressField(null=True, blank=True)
+    userAgent = models.CharField(max_length=255, null=True, blank=True)
+    archived = models.DateTimeField(auto_now_add=True, editable=False)
+
+    def __str__(self):
+        return self.token
+
+
+class RevocationEpoch(models.Model):
+    """
+    Sessions of a user issued before notBefore are revoked, except the one with the excluded digest.
+    Kept in the cache of chowkidar, and read from here when it is not cached.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='revocation_epoch',
+        editable=False
+    )
+    notBefore = models.DateTimeField()
+    excludeDigest = models.BinaryField(max_length=32, null=True, editable=False)
+
+    def __str__(self):
+        return str(self.notBefore)
+
+
 __all__ = [
-    'RefreshToken'
+    'RefreshToken',
+    'ArchivedRefreshToken',
+    'RevocationEpoch'
 ]
@@ -5,10 +5,13 @@ from django.conf import settings
 JWT_SECRET_KEY = settings.JWT_SECRET_KEY if hasattr(settings, 'JWT_SECRET_KEY') else settings.SECRET_KEY
 JWT_PUBLIC_KEY = settings.JWT_PUBLIC_KEY if hasattr(settings, 'JWT_PUBLIC_KEY') else None
 JWT_PRIVATE_KEY = settings.JWT_PRIVATE_KEY if hasattr(settings, 'JWT_PRIVATE_KEY') else None
+JWT_KEYS = settings.JWT_KEYS if hasattr(settings, 'JWT_KEYS') else None
 JWT_REFRESH_TOKEN_N_BYTES = settings.JWT_REFRESH_TOKEN_N_BYTES if hasattr(settings, 'JWT_REFRESH_TOKEN_N_BYTES') else 20
 JWT_ALGORITHM = settings.JWT_ALGORITHM if hasattr(settings, 'JWT_ALGORITHM') else 'HS256'
 JWT_LEEWAY = settings.JWT_LEEWAY if hasattr(settings, 'JWT_LEEWAY') else 0
 JWT_ISSUER = settings.JWT_ISSUER if hasattr(settings, 'JWT_ISSUER') else None
+JWT_PAYLOAD_CACHE = settings.JWT_PAYLOAD_CACHE if hasattr(settings, 'JWT_PAYLOAD_CACHE') else False
+JWT_PAYLOAD_CACHE_SIZE = settings.JWT_PAYLOAD_CACHE_SIZE if hasattr(settings, 'JWT_PAYLOAD_CACHE_SIZE') else 1024
 JWT_COOKIE_DOMAIN = settings.JWT_COOKIE_DOMAIN if hasattr(settings, 'JWT_COOKIE_DOMAIN') else None
 JWT_EXPIRATION_DELTA = (
     settings.JWT_EXPIRATION_DELTA if hasattr(settings, 'JWT_EXPIRATION_DELTA') else timedelta(seconds=60)
@@ -51,6 +54,18 @@ UPDATE_USER_LAST_LOGIN_ON_REFRESH = (
     settings.UPDATE_USER_LAST_LOGIN_ON_REFRESH if hasattr(settings, 'UPDATE_USER_LAST_LOGIN_ON_REFRESH')
     else True
 )
+UPDATE_USER_LAST_LOGIN_INTERVAL = (
+    settings.UPDATE_USER_LAST_LOGIN_INTERVAL if hasattr(settings, 'UPDATE_USER_LAST_LOGIN_INTERVAL')
+    else None
+)
+BUFFER_USER_LAST_LOGIN_UPDATES = (
+    settings.BUFFER_USER_LAST_LOGIN_UPDATES if hasattr(settings, 'BUFFER_USER_LAST_LOGIN_UPDATES')
+    else False
+)
+USER_LAST_LOGIN_FLUSH_INTERVAL = (
+    settings.USER_LAST_LOGIN_FLUSH_INTERVAL if hasattr(settings, 'USER_LAST_LOGIN_FLUSH_INTERVAL')
+    else timedelta(seconds=60)
+)
 LOG_USER_IP_IN_REFRESH_TOKEN = (
     settings.LOG_USER_IP_IN_REFRESH_TOKEN if hasattr(settings, 'LOG_USER_IP_IN_REFRESH_TOKEN')
     else True
@@ -59,6 +74,118 @@ LOG_USER_AGENT_IN_REFRESH_TOKEN = (
     settings.LOG_USER_AGENT_IN_REFRESH_TOKEN if hasattr(settings, 'LOG_USER_AGENT_IN_REFRESH_TOKEN')
     else True
 )
+STORE_REFRESH_TOKEN_DIGEST_ONLY = (
+    settings.STORE_REFRESH_TOKEN_DIGEST_ONLY if hasattr(settings, 'STORE_REFRESH_TOKEN_DIGEST_ONLY')
+    else False
+)
+REFRESH_TOKEN_COOKIE_FORMAT = (
+    settings.REFRESH_TOKEN_COOKIE_FORMAT if hasattr(settings, 'REFRESH_TOKEN_COOKIE_FORMAT')
+    else 'jwt'
+)
+REFRESH_TOKEN_STORE = (
+    settings.REFRESH_TOKEN_STORE if hasattr(settings, 'REFRESH_TOKEN_STORE')
+    else 'chowkidar.store.ModelRefreshTokenStore'
+)
+REFRESH_TOKEN_STORE_CACHE = (
+    settings.REFRESH_TOKEN_STORE_CACHE if hasattr(settings, 'REFRESH_TOKEN_STORE_CACHE')
+    else 'default'
+)
+SINGLE_FLIGHT_REFRESH_WINDOW = (
+    settings.SINGLE_FLIGHT_REFRESH_WINDOW if hasattr(settings, 'SINGLE_FLIGHT_REFRESH_WINDOW')
+    else None
+)
+REFRESH_TOKEN_ROTATION_GRACE_PERIOD = (
+    settings.REFRESH_TOKEN_ROTATION_GRACE_PERIOD if hasattr(settings, 'REFRESH_TOKEN_ROTATION_GRACE_PERIOD')
+    else timedelta(seconds=30)
+)
+PURGE_REVOKED_REFRESH_TOKENS_AFTER = (
+    settings.PURGE_REVOKED_REFRESH_TOKENS_AFTER if hasattr(settings, 'PURGE_REVOKED_REFRESH_TOKENS_AFTER')
+    else timedelta(days=30)
+)
+PURGE_EXPIRED_REFRESH_TOKENS_AFTER = (
+    settings.PURGE_EXPIRED_REFRESH_TOKENS_AFTER if hasattr(settings, 'PURGE_EXPIRED_REFRESH_TOKENS_AFTER')
+    else timedelta(days=30)
+)
+CHOWKIDAR_CACHE = (
+    settings.CHOWKIDAR_CACHE if hasattr(settings, 'CHOWKIDAR_CACHE')
+    else 'default'
+)
+GRAPHQL_MAX_BATCH_SIZE = (
+    settings.GRAPHQL_MAX_BATCH_SIZE if hasattr(settings, 'GRAPHQL_MAX_BATCH_SIZE')
+    else 10
+)
+GRAPHQL_DOCUMENT_CACHE_SIZE = (
+    settings.GRAPHQL_DOCUMENT_CACHE_SIZE if hasattr(settings, 'GRAPHQL_DOCUMENT_CACHE_SIZE')
+    else 1000
+)
+GRAPHQL_PERSISTED_QUERIES = (
+    settings.GRAPHQL_PERSISTED_QUERIES if hasattr(settings, 'GRAPHQL_PERSISTED_QUERIES')
+    else None
+)
+GRAPHQL_PERSISTED_QUERIES_ONLY = (
+    settings.GRAPHQL_PERSISTED_QUERIES_ONLY if hasattr(settings, 'GRAPHQL_PERSISTED_QUERIES_ONLY')
+    else False
+)
+GRAPHQL_MAX_QUERY_DEPTH = (
+    settings.GRAPHQL_MAX_QUERY_DEPTH if hasattr(settings, 'GRAPHQL_MAX_QUERY_DEPTH')
+    else None
+)
+GRAPHQL_MAX_QUERY_COST = (
+    settings.GRAPHQL_MAX_QUERY_COST if hasattr(settings, 'GRAPHQL_MAX_QUERY_COST')
+    else None
+)
+GRAPHQL_FIELD_COSTS = (
+    settings.GRAPHQL_FIELD_COSTS if hasattr(settings, 'GRAPHQL_FIELD_COSTS')
+    else {}
+)
+GRAPHQL_JSON_ENCODER = (
+    settings.GRAPHQL_JSON_ENCODER if hasattr(settings, 'GRAPHQL_JSON_ENCODER')
+    else 'chowkidar.utils.response.encode_json'
+)
+AUTH_RATE_LIMIT_PER_IP = (
+    settings.AUTH_RATE_LIMIT_PER_IP if hasattr(settings, 'AUTH_RATE_LIMIT_PER_IP')
+    else None
+)
+AUTH_RATE_LIMIT_PER_IDENTITY = (
+    settings.AUTH_RATE_LIMIT_PER_IDENTITY if hasattr(settings, 'AUTH_RATE_LIMIT_PER_IDENTITY')
+    else None
+)
+PASSWORD_HASHING_POOL_SIZE = (
+    settings.PASSWORD_HASHING_POOL_SIZE if hasattr(settings, 'PASSWORD_HASHING_POOL_SIZE')
+    else None
+)
+PASSWORD_HASHING_QUEUE_SIZE = (
+    settings.PASSWORD_HASHING_QUEUE_SIZE if hasattr(settings, 'PASSWORD_HASHING_QUEUE_SIZE')
+    else 16
+)
+CHANNEL_USER_CACHE_SIZE = (
+    settings.CHANNEL_USER_CACHE_SIZE if hasattr(settings, 'CHANNEL_USER_CACHE_SIZE')
+    else 1024
+)
+CHANNEL_USER_CACHE_TTL = (
+    settings.CHANNEL_USER_CACHE_TTL if hasattr(settings, 'CHANNEL_USER_CACHE_TTL')
+    else timedelta(seconds=60)
+)
+CLOSE_SOCKETS_ON_TOKEN_EXPIRY = (
+    settings.CLOSE_SOCKETS_ON_TOKEN_EXPIRY if hasattr(settings, 'CLOSE_SOCKETS_ON_TOKEN_EXPIRY')
+    else False
+)
+CHANNEL_SOCKET_EXPIRY_RESOLUTION = (
+    settings.CHANNEL_SOCKET_EXPIRY_RESOLUTION if hasattr(settings, 'CHANNEL_SOCKET_EXPIRY_RESOLUTION')
+    else 1.0
+)
+REVOCATION_CHANNEL_LAYER = (
+    settings.REVOCATION_CHANNEL_LAYER if hasattr(settings, 'REVOCATION_CHANNEL_LAYER')
+    else None
+)
+REVOKE_SESSIONS_BY_EPOCH = (
+    settings.REVOKE_SESSIONS_BY_EPOCH if hasattr(settings, 'REVOKE_SESSIONS_BY_EPOCH')
+    else False
+)
+REVOCATION_EPOCH_LOCAL_CACHE_TTL = (
+    settings.REVOCATION_EPOCH_LOCAL_CACHE_TTL if hasattr(settings, 'REVOCATION_EPOCH_LOCAL_CACHE_TTL')
+    else timedelta(seconds=5)
+)
 USER_GRAPHENE_OBJECT = (
     settings.USER_GRAPHENE_OBJECT if hasattr(settings, 'USER_GRAPHENE_OBJECT')
     else 'user.graphql.types.user.PersonalProfile'
@@ -0,0 +1,21 @@
+from functools import lru_cache
+
+from .base import BaseRefreshTokenStore
+from .db import ModelRefreshTokenStore
+from .cache import CacheRefreshTokenStore
+
+
+@lru_cache(maxsize=None)
+def get_refresh_token_store() -> BaseRefreshTokenStore:
+    """ Returns the refresh token store configured through REFRESH_TOKEN_STORE """
+    from ..settings import REFRESH_TOKEN_STORE
+    from ..utils.settings import import_string
+    return import_string(REFRESH_TOKEN_STORE)()
+
+
+__all__ = [
+    'BaseRefreshTokenStore',
+    'ModelRefreshTokenStore',
+    'CacheRefreshTokenStore',
+    'get_refresh_token_store'
+]
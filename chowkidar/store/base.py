@@ -0,0 +1,78 @@
+from datetime import datetime
+from typing import List, Optional
+
+from django.core.cache import caches
+
+from ..models import RefreshToken
+from ..settings import CHOWKIDAR_CACHE, REFRESH_TOKEN_ROTATION_GRACE_PERIOD
+
+
+class BaseRefreshTokenStore:
+    """
+    Interface through which refresh tokens (the sessions of users) are stored & retrieved.
+    Tokens are passed around as RefreshToken instances, which need not be saved in the database.
+    """
+
+    def create(self, userID, ip: str = None, userAgent: str = None) -> RefreshToken:
+        """ Issues a new refresh token for the user """
+        raise NotImplementedError
+
+    def get_active(self, token: str) -> RefreshToken:
+        """ Returns the non-revoked refresh token, raises RefreshToken.DoesNotExist if there is none """
+        raise NotImplementedError
+
+    def revoke(self, refreshToken: RefreshToken) -> bool:
+        """ Revokes the refresh token, returns False if it was already revoked """
+        raise NotImplementedError
+
+    def rotate(self, refreshToken: RefreshToken, ip: str = None, userAgent: str = None) -> Optional[RefreshToken]:
+        """
+        Revokes the refresh token & issues a new one in its place. If a concurrent request rotated it first,
+        returns the token issued by that request instead (None, if it is not available anymore).
+        """
+        if not self.revoke(refreshToken):
+            return self.get_rotated(refreshToken)
+        newToken = self.create(userID=refreshToken.user_id, ip=ip, userAgent=userAgent)
+        # shared for a short while, so that requests which lost the race can reuse it
+        caches[CHOWKIDAR_CACHE].set(
+            self.get_rotation_key(refreshToken), newToken.get_token(),
+            timeout=REFRESH_TOKEN_ROTATION_GRACE_PERIOD.total_seconds()
+        )
+        return newToken
+
+    @staticmethod
+    def get_rotation_key(refreshToken: RefreshToken) -> str:
+        return 'chowkidar:rotated:%s' % bytes(refreshToken.digest).hex()
+
+    def get_rotated(self, refreshToken: RefreshToken) -> Optional[RefreshToken]:
+        """ Returns the token issued in place of the refresh token, if it was rotated recently """
+        token = caches[CHOWKIDAR_CACHE].get(self.get_rotation_key(refreshToken))
+        if token is None:
+            return None
+        try:
+            newToken = self.get_active(token)
+        except RefreshToken.DoesNotExist:
+            return None
+        newToken._cached_token = token
+        return newToken
+
+    def revoke_for_user(self, userID, token: str) -> bool:
+        """ Revokes a session of the user by its token as listed in sessions, returns False if there is none """
+        raise NotImplementedError
+
+    def revoke_others(self, userID, exclude: Optional[RefreshToken] = None) -> None:
+        """ Revokes all active refresh tokens of the user, except the one excluded """
+        raise NotImplementedError
+
+    def list_for_user(self, userID, offset: int = 0, count: int = 10) -> List[RefreshToken]:
+        """ Lists refresh tokens of the user, active ones first and then by the latest issued """
+        raise NotImplementedError
+
+    def purge(self, revokedBefore: datetime, issuedBefore: datetime) -> int:
+        """ Deletes tokens revoked before revokedBefore, or issued before issuedBefore. Returns the count deleted """
+        raise NotImplementedError
+
+
+__all__ = [
+    'BaseRefreshTokenStore'
+]
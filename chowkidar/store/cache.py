@@ -0,0 +1,131 @@
+from django.core.cache import caches
+from django.utils import timezone
+
+from .base import BaseRefreshTokenStore
+from ..models import RefreshToken, TOKEN_HINT_LENGTH
+from ..settings import (
+    JWT_REFRESH_TOKEN_EXPIRATION_DELTA,
+    REFRESH_TOKEN_ROTATION_GRACE_PERIOD,
+    REFRESH_TOKEN_STORE_CACHE,
+    STORE_REFRESH_TOKEN_DIGEST_ONLY
+)
+
+
+class CacheRefreshTokenStore(BaseRefreshTokenStore):
+    """
+    Stores refresh tokens in a Django cache (like redis), keyed by their digest, each kept till it expires.
+    Sessions of a user are indexed under a separate key, which is updated on a best-effort basis.
+    """
+
+    def __init__(self, alias: str = None):
+        self.cache = caches[alias or REFRESH_TOKEN_STORE_CACHE]
+
+    @staticmethod
+    def get_token_key(digest: bytes) -> str:
+        return 'chowkidar:rt:%s' % bytes(digest).hex()
+
+    @staticmethod
+    def get_user_key(userID) -> str:
+        return 'chowkidar:rt-user:%s' % userID
+
+    @staticmethod
+    def get_timeout(record: dict) -> float:
+        expiry = record['issued'] + JWT_REFRESH_TOKEN_EXPIRATION_DELTA
+        return max((expiry - timezone.now()).total_seconds(), 1)
+
+    @staticmethod
+    def to_instance(record: dict) -> RefreshToken:
+        return RefreshToken(
+            user_id=record['userID'],
+            token=record['token'],
+            digest=record['digest'],
+            issued=record['issued'],
+            revoked=record['revoked'],
+            ip=record['ip'],
+            userAgent=record['userAgent']
+        )
+
+    def save_records(self, records: list) -> None:
+        for record in records:
+            self.cache.set(self.get_token_key(record['digest']), record, timeout=self.get_timeout(record))
+
+    def get_records_of_user(self, userID) -> list:
+        digests = self.cache.get(self.get_user_key(userID), [])
+        records = self.cache.get_many([self.get_token_key(digest) for digest in digests])
+        return list(records.values())
+
+    def create(self, userID, ip=None, userAgent=None):
+        token = RefreshToken.generate_token()
+        record = {
+            'userID': userID,
+            'token': token[:TOKEN_HINT_LENGTH] if STORE_REFRESH_TOKEN_DIGEST_ONLY else token,
+            'digest': RefreshToken.digest_token(token),
+            'issued': timezone.now(),
+            'revoked': None,
+            'ip': ip,
+            'userAgent': userAgent
+        }
+        self.save_records([record])
+        # index the token under the user, dropping tokens which have expired from the cache
+        digests = [r['digest'] for r in self.get_records_of_user(userID)] + [record['digest']]
+        self.cache.set(self.get_user_key(userID), digests, timeout=JWT_REFRESH_TOKEN_EXPIRATION_DELTA.total_seconds())
+        rt = self.to_instance(record)
+        rt._cached_token = token
+        return rt
+
+    def get_active(self, token):
+        record = self.cache.get(self.get_token_key(RefreshToken.digest_token(token)))
+        if record is None or record['revoked'] is not None:
+            raise RefreshToken.DoesNotExist('Refresh token not found')
+        return self.to_instance(record)
+
+    def revoke(self, refreshToken):
+        record = self.cache.get(self.get_token_key(refreshToken.digest))
+        if record is None or record['revoked'] is not None:
+            return False
+        record['revoked'] = refreshToken.revoked = timezone.now()
+        self.save_records([record])
+        return True
+
+    def rotate(self, refreshToken, ip=None, userAgent=None):
+        # only the request which adds the lock rotates the token
+        lockKey = 'chowkidar:rotating:%s' % bytes(refreshToken.digest).hex()
+        if not self.cache.add(lockKey, True, timeout=REFRESH_TOKEN_ROTATION_GRACE_PERIOD.total_seconds()):
+            return self.get_rotated(refreshToken)
+        return super().rotate(refreshToken, ip=ip, userAgent=userAgent)
+
+    def revoke_for_user(self, userID, token):
+        for record in self.get_records_of_user(userID):
+            if record['token'] == token and record['revoked'] is None:
+                record['revoked'] = timezone.now()
+                self.save_records([record])
+                return True
+        return False
+
+    def revoke_others(self, userID, exclude=None):
+        excluded = bytes(exclude.digest) if exclude is not None else None
+        now = timezone.now()
+        records = []
+        for record in self.get_records_of_user(userID):
+            if record['revoked'] is None and record['digest'] != excluded:
+                record['revoked'] = now
+                records.append(record)
+        self.save_records(records)
+
+    def list_for_user(self, userID, offset=0, count=10):
+        records = sorted(
+            self.get_records_of_user(userID),
+            # active tokens first, then by the latest revoked & issued
+            key=lambda r: (r['revoked'] is None, r['revoked'] or r['issued'], r['issued']),
+            reverse=True
+        )
+        return [self.to_instance(record) for record in records[offset:offset+count]]
+
+    def purge(self, revokedBefore, issuedBefore):
+        # tokens are evicted by the cache once they expire
+        return 0
+
+
+__all__ = [
+    'CacheRefreshTokenStore'
+]
@@ -0,0 +1,85 @@
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .base import BaseRefreshTokenStore
+from ..models import RefreshToken, ArchivedRefreshToken
+
+
+class ModelRefreshTokenStore(BaseRefreshTokenStore):
+    """ Stores refresh tokens in the database, through the RefreshToken model """
+
+    def create(self, userID, ip=None, userAgent=None):
+        return RefreshToken.objects.create(user_id=userID, ip=ip, userAgent=userAgent)
+
+    def get_active(self, token):
+        return RefreshToken.objects.select_related('user').filter_by_token(token).get(
+            revoked__isnull=True  # A refresh token is revoked if the revoked timestamp is set
+        )
+
+    def revoke(self, refreshToken):
+        revoked = timezone.now()
+        count = RefreshToken.objects.filter(id=refreshToken.id, revoked__isnull=True).update(revoked=revoked)
+        if count:
+            refreshToken.revoked = revoked
+        return bool(count)
+
+    def rotate(self, refreshToken, ip=None, userAgent=None):
+        # the conditional revoke, the new token & sharing it are committed together,
+        # concurrent rotations wait on the row lock and find the token already revoked
+        with transaction.atomic():
+            return super().rotate(refreshToken, ip=ip, userAgent=userAgent)
+
+    def revoke_for_user(self, userID, token):
+        return bool(
+            RefreshToken.objects.filter(user_id=userID, token=token, revoked__isnull=True).update(
+                revoked=timezone.now()
+            )
+        )
+
+    def revoke_others(self, userID, exclude=None):
+        tokens = RefreshToken.objects.filter(user_id=userID, revoked__isnull=True)
+        if exclude is not None:
+            tokens = tokens.exclude(id=exclude.id)
+        tokens.update(revoked=timezone.now())
+
+    def list_for_user(self, userID, offset=0, count=10):
+        return RefreshToken.objects.filter(
+            user_id=userID
+        ).order_by(F('revoked').desc(nulls_first=True), '-issued')[offset:offset+count]
+
+    def purge(self, revokedBefore, issuedBefore):
+        return sum(self.purge_in_batches(revokedBefore=revokedBefore, issuedBefore=issuedBefore))
+
+    @staticmethod
+    def get_purgeable(revokedBefore, issuedBefore):
+        return RefreshToken.objects.filter(Q(revoked__lt=revokedBefore) | Q(issued__lt=issuedBefore))
+
+    def purge_in_batches(self, revokedBefore, issuedBefore, batchSize: int = 1000, archive: bool = False):
+        """
+        Deletes purgeable tokens in batches keyed by the primary key, each in its own short transaction,
+        optionally moving them to ArchivedRefreshToken. Yields the count deleted in each batch.
+        """
+        lastID = 0
+        while True:
+            batch = list(
+                self.get_purgeable(revokedBefore, issuedBefore).filter(id__gt=lastID).order_by('id')[:batchSize]
+            )
+            if not batch:
+                return
+            lastID = batch[-1].id
+            with transaction.atomic():
+                if archive:
+                    ArchivedRefreshToken.objects.bulk_create([
+                        ArchivedRefreshToken(
+                            id=rt.id, user_id=rt.user_id, token=rt.token, digest=rt.digest,
+                            issued=rt.issued, revoked=rt.revoked, ip=rt.ip, userAgent=rt.userAgent
+                        ) for rt in batch
+                    ], ignore_conflicts=True)
+                RefreshToken.objects.filter(id__in=[rt.id for rt in batch]).delete()
+            yield len(batch)
+
+
+__all__ = [
+    'ModelRefreshTokenStore'
+]
@@ -1,8 +1,67 @@
+import asyncio
+import json
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from importlib import import_module
+from io import StringIO
+from unittest import mock
+
 import graphene
+from asgiref.sync import async_to_sync, sync_to_async
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from django.apps import apps
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.auth.signals import user_login_failed
+from django.core import signing
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.test import TestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from graphql.language.parser import parse
 
-from chowkidar.graphql import AuthMutations
+from chowkidar.auth import (
+    ChowkidarAuthMiddleware,
+    authenticate_user_from_credentials,
+    handler,
+    last_login,
+    respond_handling_authentication
+)
+from chowkidar.auth.backends import ChowkidarAuthBackend
+from chowkidar.auth.context import get_auth_context, get_auth_context_async
+from chowkidar.auth.epoch import get_revocation_epoch, revoke_sessions_by_epoch
+from chowkidar.auth.fingerprint import encode_fingerprint, verify_fingerprint
+from chowkidar.auth.handler import generate_refresh_token_cookie_data_from_userID, logout_user
+from chowkidar.auth.hashing import PasswordHashingPool
+from chowkidar.auth.verify import resolve_user_from_tokens, verify_refresh_token
+from chowkidar.graphql import AsyncGraphQLView, AuthMutations, AuthQueries, GraphQLView
+from chowkidar.graphql.channel import ChannelAuthMiddleware, channel_user_cache, handle_revocation, socket_expiry_wheel
+from chowkidar.graphql.complexity import analyze_query_cost
+from chowkidar.graphql.documents import document_cache, hash_query
+from chowkidar.graphql.schema import revoke_other_tokens
+from chowkidar.graphql.sockets import ExpiryWheel, SocketConnection
+from chowkidar.models import ArchivedRefreshToken, RefreshToken, RevocationEpoch
+from chowkidar.settings import JWT_EXPIRATION_DELTA, JWT_REFRESH_TOKEN_EXPIRATION_DELTA
+from chowkidar.store import CacheRefreshTokenStore, ModelRefreshTokenStore, get_refresh_token_store
+from chowkidar.utils import (
+    AuthError,
+    decode_payload_from_token,
+    generate_refresh_token,
+    generate_token_from_claims,
+    jwt,
+    payload_cache
+)
+from chowkidar.utils.cache import TTLCache
+from chowkidar.utils.keyring import Key, Keyring, load_keyring_from_settings
+from chowkidar.utils.response import encode_json, json_response
 
 User = get_user_model()
 
@@ -16,6 +75,7 @@ class Query(graphene.ObjectType):
 
 
 schema = graphene.Schema(mutation=Mutation, query=Query)
+sessionSchema = graphene.Schema(mutation=Mutation, query=AuthQueries)
 
 
 class AuthenticateUserTest(TestCase):
@@ -114,3 +174,912 @@ class AuthenticateUserTest(TestCase):
             context=self.unAuthContext
         )
         assert result.errors
+
+
+class PayloadCacheTest(TestCase):
+
+    def setUp(self):
+        self.cache = payload_cache
+        self.cache.clear()
+
+    def test_verified_payload_is_reused(self):
+        data = generate_token_from_claims(claims={'userID': 1}, expirationDelta=timedelta(seconds=60))
+        with mock.patch.object(jwt, 'JWT_PAYLOAD_CACHE', True):
+            with mock.patch.object(jwt, 'decode_token', wraps=jwt.decode_token) as decode:
+                assert decode_payload_from_token(data['token'])['userID'] == 1
+                assert decode_payload_from_token(data['token'])['userID'] == 1
+                assert decode.call_count == 1
+        assert self.cache.stats()['hits'] == 1
+        assert self.cache.stats()['misses'] == 1
+
+    def test_expired_entries_are_not_served(self):
+        self.cache.set('token', {'userID': 1}, expiresAt=time.time() + 60)
+        assert self.cache.get('token') == {'userID': 1}
+        self.cache.set('stale', {'userID': 1}, expiresAt=time.time() - 1)
+        assert self.cache.get('stale') is None
+
+    def test_cache_is_bounded(self):
+        ttlCache = TTLCache(maxsize=2)
+        for key in ['a', 'b', 'c']:
+            ttlCache.set(key, key, expiresAt=time.time() + 60)
+        assert len(ttlCache) == 2
+        assert ttlCache.get('a') is None
+
+
+class KeyringTest(TestCase):
+
+    @staticmethod
+    def generate_private_key() -> str:
+        return rsa.generate_private_key(public_exponent=65537, key_size=2048).private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption()
+        ).decode()
+
+    def test_rotation_keeps_tokens_of_retired_keys_valid(self):
+        oldKey = Key(kid='old', algorithm='RS256', private_key=self.generate_private_key())
+        newKey = Key(kid='new', algorithm='RS256', private_key=self.generate_private_key())
+
+        with mock.patch.object(jwt, 'keyring', Keyring(keys=[oldKey])):
+            oldToken = generate_token_from_claims(claims={'userID': 1}, expirationDelta=timedelta(seconds=60))['token']
+
+        oldKey.retired = True
+        with mock.patch.object(jwt, 'keyring', Keyring(keys=[oldKey, newKey])):
+            newToken = generate_token_from_claims(claims={'userID': 2}, expirationDelta=timedelta(seconds=60))['token']
+            assert jwt.jwt.get_unverified_header(newToken)['kid'] == 'new'
+            assert decode_payload_from_token(oldToken)['userID'] == 1
+            assert decode_payload_from_token(newToken)['userID'] == 2
+
+        # once the old key is dropped from the keyring, its tokens are no longer accepted
+        with mock.patch.object(jwt, 'keyring', Keyring(keys=[newKey])):
+            with self.assertRaises(AuthError):
+                decode_payload_from_token(oldToken)
+
+    def test_tokens_without_kid_are_verified_by_the_legacy_key(self):
+        with mock.patch.object(jwt, 'keyring', Keyring(keys=[Key(algorithm='HS256', secret_key='legacy')])):
+            oldToken = generate_token_from_claims(claims={'userID': 1}, expirationDelta=timedelta(seconds=60))['token']
+
+        with mock.patch('chowkidar.settings.JWT_KEYS', [{'kid': 'new', 'secret_key': 'new'}]), \
+                mock.patch('chowkidar.settings.JWT_SECRET_KEY', 'legacy'):
+            keyring = load_keyring_from_settings()
+        assert keyring.get_signing_key().kid == 'new'
+        with mock.patch.object(jwt, 'keyring', keyring):
+            assert decode_payload_from_token(oldToken)['userID'] == 1
+
+
+class AuthContextTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="chowkidar", email="chowkidar@example.com")
+
+    @staticmethod
+    def get_request(**cookies):
+        request = RequestFactory().post('/graphql/', HTTP_USER_AGENT='Chowkidar/1.0')
+        request.COOKIES.update(cookies)
+        return request
+
+    def test_refresh_token_is_verified_once_per_request(self):
+        data = generate_refresh_token_cookie_data_from_userID(userID=self.user.id, request=self.get_request())
+        request = self.get_request(JWT_REFRESH_TOKEN=data['token'])
+        with CaptureQueriesContext(connection) as queries:
+            result = sessionSchema.execute(
+                '{ mySessions { isActive ip } }', context=request, middleware=[ChowkidarAuthMiddleware()]
+            )
+            resp = respond_handling_authentication(request=request, result={'data': result.data}, status_code=200)
+        assert not result.errors
+        assert result.data['mySessions'][0]['isActive']
+        assert 'JWT_TOKEN' in resp.cookies
+        refreshTokenSelects = [
+            query for query in queries.captured_queries
+            if query['sql'].startswith('SELECT') and 'FROM "chowkidar_refreshtoken"' in query['sql']
+        ]
+        # one lookup to verify the refresh token, and one to list the sessions
+        assert len(refreshTokenSelects) == 2
+
+
+class ViewQuery(graphene.ObjectType):
+    userID = graphene.String()
+
+    def resolve_userID(self, info):
+        return info.context.userID
+
+
+class OperationAuthTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="chowkidar", email="chowkidar@example.com")
+
+    def execute(self, query, **cookies):
+        view = GraphQLView.as_view(
+            schema=graphene.Schema(query=ViewQuery),
+            middleware=[ChowkidarAuthMiddleware()]
+        )
+        request = RequestFactory().post(
+            '/graphql/', data=json.dumps({'query': query}), content_type='application/json',
+            HTTP_USER_AGENT='Chowkidar/1.0'
+        )
+        request.COOKIES.update(cookies)
+        request.user = AnonymousUser()
+        return json.loads(view(request).content)
+
+    def test_user_is_resolved_before_execution(self):
+        token = generate_token_from_claims(claims={'userID': self.user.id}, expirationDelta=timedelta(seconds=60))
+        result = self.execute('{ userID }', JWT_TOKEN=token['token'])
+        assert result['data']['userID'] == str(self.user.id)
+        assert self.execute('{ userID }')['data']['userID'] is None
+
+    def test_access_token_is_verified_without_queries(self):
+        cache.clear()
+        token = generate_token_from_claims(claims={'userID': self.user.id}, expirationDelta=timedelta(seconds=60))
+        with CaptureQueriesContext(connection) as queries:
+            result = self.execute('{ userID }', JWT_TOKEN=token['token'])
+        assert result['data']['userID'] == str(self.user.id)
+        assert len(queries) == 0
+
+    def test_introspection_is_protected(self):
+        query = '{ __schema { queryType { fields { name } } } }'
+        with mock.patch('chowkidar.auth.middleware.PROTECT_GRAPHQL', True):
+            fields = self.execute(query)['data']['__schema']['queryType']['fields']
+        assert [field['name'] for field in fields] == ['DJANGO_SECRET_KEY']
+        with mock.patch('chowkidar.auth.middleware.PROTECT_GRAPHQL', False):
+            fields = self.execute(query)['data']['__schema']['queryType']['fields']
+        assert [field['name'] for field in fields] == ['userID']
+
+
+class RefreshTokenDigestTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="chowkidar", email="chowkidar@example.com")
+
+    def test_token_is_looked_up_by_digest(self):
+        rt = RefreshToken.objects.create(user=self.user)
+        assert rt.token == rt.get_token()
+        assert RefreshToken.objects.filter_by_token(rt.get_token()).get(revoked__isnull=True).id == rt.id
+
+    def test_only_digest_is_stored_in_digest_only_mode(self):
+        with mock.patch('chowkidar.models.STORE_REFRESH_TOKEN_DIGEST_ONLY', True):
+            rt = RefreshToken.objects.create(user=self.user)
+        stored = RefreshToken.objects.get(id=rt.id)
+        assert stored.token != rt.get_token()
+        assert rt.get_token().startswith(stored.token)
+        assert bytes(stored.digest) == RefreshToken.digest_token(rt.get_token())
+        assert RefreshToken.objects.filter_by_token(rt.get_token()).get(revoked__isnull=True).id == rt.id
+
+    def test_digest_is_indexed_without_partial_indexes(self):
+        migration = import_module('chowkidar.migrations.0006_refreshtoken_digest_index')
+        schemaEditor = mock.Mock(quote_name=lambda name: '`%s`' % name)
+        schemaEditor.connection.vendor = 'mysql'
+        schemaEditor.connection.features.supports_partial_indexes = False
+        migration.create_digest_index(apps, schemaEditor)
+        schemaEditor.execute.assert_called_once_with(
+            'CREATE INDEX `chowkidar_refreshtoken_digest_idx` ON `chowkidar_refreshtoken` (`digest`(32))'
+        )
+
+
+class RefreshTokenStoreTestMixin:
+
+    def get_store(self):
+        raise NotImplementedError
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="chowkidar", email="chowkidar@example.com")
+
+    def test_issued_token_is_active_till_revoked(self):
+        store = self.get_store()
+        rt = store.create(userID=self.user.id, ip='127.0.0.1', userAgent='Chowkidar/1.0')
+        active = store.get_active(rt.get_token())
+        assert active.user_id == self.user.id and active.ip == '127.0.0.1'
+        assert store.revoke(active)
+        assert not store.revoke(active)
+        with self.assertRaises(RefreshToken.DoesNotExist):
+            store.get_active(rt.get_token())
+
+    def test_revoke_sessions_of_user(self):
+        store = self.get_store()
+        current = store.create(userID=self.user.id)
+        other = store.create(userID=self.user.id)
+        another = store.create(userID=self.user.id)
+        assert store.revoke_for_user(userID=self.user.id, token=another.token)
+        assert not store.revoke_for_user(userID=self.user.id, token=another.token)
+        store.revoke_others(userID=self.user.id, exclude=current)
+        store.get_active(current.get_token())
+        sessions = store.list_for_user(userID=self.user.id)
+        assert len(sessions) == 3
+        assert sessions[0].revoked is None and sessions[0].token == current.token
+        assert all(session.revoked is not None for session in sessions[1:])
+        assert other.token in [session.token for session in sessions]
+
+    def test_concurrent_rotations_issue_one_token(self):
+        cache.clear()
+        store = self.get_store()
+        rt = store.create(userID=self.user.id, ip='127.0.0.1')
+        stale = store.get_active(rt.get_token())
+        newToken = store.rotate(rt, ip='127.0.0.2')
+        # a request which verified the token before it was rotated, reuses the token issued by the winner
+        reused = store.rotate(stale, ip='127.0.0.2')
+        assert reused.get_token() == newToken.get_token()
+        sessions = store.list_for_user(userID=self.user.id)
+        assert len(sessions) == 2
+        assert [session.ip for session in sessions if session.revoked is None] == ['127.0.0.2']
+
+
+class ModelRefreshTokenStoreTest(RefreshTokenStoreTestMixin, TestCase):
+
+    def get_store(self):
+        return ModelRefreshTokenStore()
+
+
+class CacheRefreshTokenStoreTest(RefreshTokenStoreTestMixin, TestCase):
+
+    def get_store(self):
+        store = CacheRefreshTokenStore()
+        store.cache = LocMemCache('chowkidar-tests', {})
+        store.cache.clear()
+        return store
+
+
+class LastLoginTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="chowkidar", email="chowkidar@example.com")
+
+    def test_last_login_is_throttled(self):
+        with mock.patch.object(last_login, 'UPDATE_USER_LAST_LOGIN_INTERVAL', timedelta(minutes=5)):
+            with self.assertNumQueries(1):
+                last_login.set_user_last_login(self.user)
+            with self.assertNumQueries(0):
+                last_login.set_user_last_login(self.user)
+        assert User.objects.get(id=self.user.id).last_login == self.user.last_login
+
+    def test_buffered_last_login_is_flushed_in_bulk(self):
+        other = User.objects.create(username="other", email="other@example.com")
+        with mock.patch.object(last_login, 'BUFFER_USER_LAST_LOGIN_UPDATES', True), \
+                mock.patch.object(last_login, 'USER_LAST_LOGIN_FLUSH_INTERVAL', timedelta(hours=1)):
+            with self.assertNumQueries(0):
+                last_login.set_user_last_login(self.user)
+                last_login.set_user_last_login(other)
+        assert User.objects.get(id=self.user.id).last_login is None
+        with self.assertNumQueries(1):
+            assert last_login.flush_last_login_updates() == 2
+        assert User.objects.get(id=other.id).last_login == other.last_login
+
+
+class SingleFlightRefreshTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="chowkidar", email="chowkidar@example.com")
+
+    def test_parallel_refreshes_reuse_the_access_token(self):
+        cache.clear()
+        request = AuthContextTest.get_request()
+        data = generate_refresh_token_cookie_data_from_userID(userID=self.user.id, request=request)
+        responses = []
+        with mock.patch.object(handler, 'SINGLE_FLIGHT_REFRESH_WINDOW', timedelta(seconds=10)), \
+                mock.patch('chowkidar.auth.singleflight.SINGLE_FLIGHT_REFRESH_WINDOW', timedelta(seconds=10)):
+            for _ in range(3):
+                request = AuthContextTest.get_request(JWT_REFRESH_TOKEN=data['token'])
+                with CaptureQueriesContext(connection) as queries:
+                    responses.append(respond_handling_authentication(
+                        request=request, result={'data': None}, status_code=200
+                    ))
+                if len(responses) > 1:
+                    # parallel requests neither verify the refresh token nor write last_login again
+                    assert len(queries.captured_queries) == 0
+        tokens = set(resp.cookies['JWT_TOKEN'].value for resp in responses)
+        assert len(tokens) == 1
+
+    def test_parallel_requests_to_the_view_reuse_the_access_token(self):
+        cache.clear()
+        view = GraphQLView.as_view(schema=graphene.Schema(query=ViewQuery), middleware=[ChowkidarAuthMiddleware()])
+        request = AuthContextTest.get_request()
+        data = generate_refresh_token_cookie_data_from_userID(userID=self.user.id, request=request)
+        with mock.patch('chowkidar.auth.handler.SINGLE_FLIGHT_REFRESH_WINDOW', timedelta(seconds=10)), \
+                mock.patch('chowkidar.auth.context.SINGLE_FLIGHT_REFRESH_WINDOW', timedelta(seconds=10)), \
+                mock.patch('chowkidar.auth.singleflight.SINGLE_FLIGHT_REFRESH_WINDOW', timedelta(seconds=10)):
+            for i in range(3):
+                request = RequestFactory().post(
+                    '/graphql/', data=json.dumps({'query': '{ userID }'}), content_type='application/json',
+                    HTTP_USER_AGENT='Chowkidar/1.0'
+                )
+                request.COOKIES['JWT_REFRESH_TOKEN'] = data['token']
+                request.user = AnonymousUser()
+                with CaptureQueriesContext(connection) as queries:
+                    resp = view(request)
+                assert json.loads(resp.content)['data']['userID'] == str(self.user.id)
+                assert 'JWT_TOKEN' in resp.cookies
+                if i > 0:
+                    # the user is resolved from the access token issued by the first request
+                    sqls = [query['sql'] for query in queries.captured_queries]
+                    assert not [sql for sql in sqls if 'chowkidar_refreshtoken' in sql]
+
+    def test_revoking_tokens_stops_reusing_the_access_token(self):
+        cache.clear()
+        request = AuthContextTest.get_request()
+        data = generate_refresh_token_cookie_data_from_userID(userID=self.user.id, request=request)
+        with mock.patch('chowkidar.auth.handler.SINGLE_FLIGHT_REFRESH_WINDOW', timedelta(seconds=10)), \
+                mock.patch('chowkidar.auth.context.SINGLE_FLIGHT_REFRESH_WINDOW', timedelta(seconds=10)), \
+                mock.patch('chowkidar.auth.singleflight.SINGLE_FLIGHT_REFRESH_WINDOW', timedelta(seconds=10)):
+            request = AuthContextTest.get_request(JWT_REFRESH_TOKEN=data['token'])
+            respond_handling_authentication(request=request, result={'data': None}, status_code=200)
+            request = AuthContextTest.get_request(JWT_REFRESH_TOKEN=data['token'])
+            assert get_auth_context(request).refreshedPayload is not None
+
+            revoke_other_tokens(userID=self.user.id, request=AuthContextTest.get_request())
+            request = AuthContextTest.get_request(JWT_REFRESH_TOKEN=data['token'])
+            # the revoked refresh token is verified again, instead of resolving the shared access token
+            assert get_auth_context(request).refreshedPayload is None
+            assert get_auth_context(request).userID is None
+
+
+class PurgeCommandTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="chowkidar", email="chowkidar@example.com")
+        cls.active = RefreshToken.objects.create(user=cls.user)
+        cls.revoked = RefreshToken.objects.create(user=cls.user)
+        cls.expired = RefreshToken.objects.create(user=cls.user)
+        RefreshToken.objects.filter(id=cls.revoked.id).update(revoked=timezone.now() - timedelta(days=60))
+        RefreshToken.objects.filter(id=cls.expired.id).update(issued=timezone.now() - timedelta(days=60))
+
+    def call_command(self, *args):
+        out = StringIO()
+        call_command('chowkidar_purge', *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run_only_counts(self):
+        assert '2 refresh tokens would be purged' in self.call_command('--dry-run')
+        assert RefreshToken.objects.count() == 3
+
+    def test_purged_tokens_are_archived_in_batches(self):
+        assert 'Archived 2 refresh tokens' in self.call_command('--archive', '--batch-size', '1')
+        assert list(RefreshToken.objects.values_list('id', flat=True)) == [self.active.id]
+        assert set(ArchivedRefreshToken.objects.values_list('id', flat=True)) == {self.revoked.id, self.expired.id}
+
+
+class JSONEncoderTest(TestCase):
+
+    def test_dates_are_encoded_as_django_does(self):
+        data = {'data': {'refreshExpiresIn': datetime(2021, 1, 11, 19, 22, 1, 123456), 'ids': [1, 2]}}
+        assert json.loads(encode_json(data)) == json.loads(json.dumps(data, cls=DjangoJSONEncoder))
+        resp = json_response(data, status=200)
+        assert resp['Content-Type'] == 'application/json'
+        assert json.loads(resp.content)['data']['ids'] == [1, 2]
+
+    def test_pretty_responses_are_indented(self):
+        def respond(view, path):
+            request = RequestFactory().post(
+                path, data=json.dumps({'query': '{ userID }'}), content_type='application/json'
+            )
+            request.user = AnonymousUser()
+            return view(request).content.decode()
+
+        schema = graphene.Schema(query=ViewQuery)
+        pretty = json.dumps({'data': {'userID': None}}, indent=2)
+        assert respond(GraphQLView.as_view(schema=schema, pretty=True), '/graphql/') == pretty
+        assert respond(GraphQLView.as_view(schema=schema), '/graphql/?pretty=1') == pretty
+        assert respond(GraphQLView.as_view(schema=schema), '/graphql/') == '{"data":{"userID":null}}'
+
+
+class SessionRegistryTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="chowkidar", email="chowkidar@example.com")
+        cls.user.set_password("W3@kP@$$w0rb!")
+        cls.user.save()
+
+    def test_aliased_login_issues_session(self):
+        view = GraphQLView.as_view(schema=schema)
+        request = RequestFactory().post(
+            '/graphql/', content_type='application/json', HTTP_USER_AGENT='Chowkidar/1.0',
+            data=json.dumps({'query': """
+                mutation { login: authenticateUser(username: "chowkidar", password: "W3@kP@$$w0rb!") { success } }
+            """})
+        )
+        request.user = AnonymousUser()
+        resp = view(request)
+        result = json.loads(resp.content)
+        assert result['data']['login']['success']
+        assert 'refreshExpiresIn' in result['data']['login']
+        assert resp.cookies['JWT_REFRESH_TOKEN'].value
+
+
+class BatchTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="chowkidar", email="chowkidar@example.com")
+        cls.user.set_password("W3@kP@$$w0rb!")
+        cls.user.save()
+
+    def execute(self, operations):
+        view = GraphQLView.as_view(schema=schema, batch=True)
+        request = RequestFactory().post(
+            '/graphql/', content_type='application/json', HTTP_USER_AGENT='Chowkidar/1.0',
+            data=json.dumps(operations)
+        )
+        request.user = AnonymousUser()
+        return view(request)
+
+    def test_batch_shares_one_session_decision(self):
+        resp = self.execute([
+            {'id': 1, 'query': '{ test }'},
+            {'id': 2, 'query': 'mutation { authenticateUser(username: "chowkidar", password: "W3@kP@$$w0rb!") { success } }'},
+        ])
+        results = json.loads(resp.content)
+        assert [result['id'] for result in results] == [1, 2]
+        assert 'refreshExpiresIn' in results[1]['data']['authenticateUser']
+        assert resp.cookies['JWT_REFRESH_TOKEN'].value
+
+    def test_batch_size_is_limited(self):
+        with mock.patch('chowkidar.graphql.view.GRAPHQL_MAX_BATCH_SIZE', 1):
+            resp = self.execute([{'query': '{ test }'}, {'query': '{ test }'}])
+        assert resp.status_code == 400
+
+    def test_malformed_batches_are_rejected(self):
+        assert self.execute(['{ test }']).status_code == 400
+        assert self.execute({'query': '{ test }'}).status_code == 400
+
+
+class DocumentCacheTest(TestCase):
+
+    def execute(self, data):
+        view = GraphQLView.as_view(schema=schema)
+        request = RequestFactory().post(
+            '/graphql/', content_type='application/json', HTTP_USER_AGENT='Chowkidar/1.0', data=json.dumps(data)
+        )
+        request.user = AnonymousUser()
+        return json.loads(view(request).content)
+
+    def test_document_is_parsed_and_validated_once(self):
+        document_cache.clear()
+        with mock.patch('chowkidar.graphql.documents.validate', return_value=[]) as validate:
+            assert self.execute({'query': '{ test }'}) == {'data': {'test': None}}
+            assert self.execute({'query': '{ test }'}) == {'data': {'test': None}}
+        assert validate.call_count == 1
+        assert document_cache.stats()['hits'] == 1
+
+    def test_persisted_queries_are_resolved_by_hash(self):
+        queryHash = hash_query('{ test }')
+        extensions = {'persistedQuery': {'version': 1, 'sha256Hash': queryHash}}
+        with mock.patch('chowkidar.graphql.view.persisted_queries', {queryHash: '{ test }'}):
+            assert self.execute({'extensions': extensions}) == {'data': {'test': None}}
+            with mock.patch('chowkidar.graphql.view.GRAPHQL_PERSISTED_QUERIES_ONLY', True):
+                result = self.execute({'query': '{ __typename }'})
+        assert result['errors'][0]['code'] == 'PERSISTED_QUERY_NOT_FOUND'
+
+    def test_deep_and_costly_queries_are_rejected(self):
+        query = '{ test ...Fields } fragment Fields on Query { test }'
+        with mock.patch('chowkidar.graphql.complexity.GRAPHQL_MAX_QUERY_DEPTH', 2), \
+                mock.patch('chowkidar.graphql.complexity.GRAPHQL_MAX_QUERY_COST', 5), \
+                mock.patch.dict('chowkidar.graphql.complexity.GRAPHQL_FIELD_COSTS', {'Query.test': 3}):
+            result = self.execute({'query': query})
+            assert result['errors'][0]['code'] == 'QUERY_TOO_COMPLEX'
+            assert result['errors'][0]['params'] == {'cost': 6, 'maxCost': 5}
+            assert self.execute({'query': '{ test }'}) == {'data': {'test': None}}
+
+    def test_fragments_are_measured_once(self):
+        # each fragment spreads the next one twice, 2^20 fields once expanded
+        query = '{ ...F0 } ' + ' '.join(
+            'fragment F%d on Query { ...F%d ...F%d }' % (i, i + 1, i + 1) for i in range(20)
+        ) + ' fragment F20 on Query { test }'
+        queryCost = analyze_query_cost(schema, parse(query))
+        assert (queryCost.depth, queryCost.cost) == (1, 2 ** 20)
+
+        introspection = parse('{ __typename __schema { types { fields { type { fields { name } } } } } }')
+        with mock.patch('chowkidar.graphql.complexity.GRAPHQL_MAX_QUERY_DEPTH', 3):
+            assert analyze_query_cost(schema, introspection).depth > 3
+
+
+class PasswordHashingPoolTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="chowkidar", email="chowkidar@example.com")
+        cls.user.set_password("W3@kP@$$w0rb!")
+        cls.user.save()
+
+    def test_backend_hashes_in_the_pool(self):
+        pool = PasswordHashingPool(workers=2)
+        with mock.patch('chowkidar.auth.hashing.password_hashing_pool', pool):
+            backend = ChowkidarAuthBackend()
+            assert backend.authenticate(None, username="chowkidar", password="W3@kP@$$w0rb!") == self.user
+            assert backend.authenticate(None, username="chowkidar", password="wrong") is None
+            assert backend.authenticate(None, username="nobody", password="wrong") is None
+        assert pool.stats()['completed'] == 3
+
+    def test_overflow_fails_fast(self):
+        pool = PasswordHashingPool(workers=1)
+        started, release = threading.Event(), threading.Event()
+        thread = threading.Thread(target=pool.run, args=(lambda: started.set() or release.wait(5),))
+        thread.start()
+        started.wait(5)
+        try:
+            pool.run(lambda: True)
+            assert False, 'pool should have rejected the hash'
+        except AuthError as e:
+            assert e.code == 'AUTH_BUSY'
+        finally:
+            release.set()
+            thread.join()
+        assert pool.run(lambda: True) is True
+        assert pool.stats()['rejected'] == 1
+
+
+class RateLimitTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def authenticate(self, username):
+        request = RequestFactory().post('/graphql/', HTTP_USER_AGENT='Chowkidar/1.0')
+        request.user = AnonymousUser()
+        return schema.execute(
+            'mutation ($username: String!) { authenticateUser(username: $username, password: "wrong") { success } }',
+            variables={'username': username}, context=request
+        )
+
+    def test_attempts_over_the_limit_skip_authentication(self):
+        with mock.patch('chowkidar.auth.ratelimit.AUTH_RATE_LIMIT_PER_IDENTITY', (2, timedelta(minutes=1))), \
+                mock.patch('chowkidar.auth.ratelimit.AUTH_RATE_LIMIT_PER_IP', (3, timedelta(minutes=1))), \
+                mock.patch('chowkidar.graphql.schema.authenticate_user_from_credentials') as authenticate:
+            authenticate.side_effect = AuthError('wrong', code='INVALID_CREDENTIALS')
+            codes = [self.authenticate('chowkidar').errors[0].original_error.code for _ in range(3)]
+            assert codes == ['INVALID_CREDENTIALS', 'INVALID_CREDENTIALS', 'RATE_LIMITED']
+            # the rejected attempt is not counted against the IP, which is over its limit after the 3rd attempt
+            codes = [self.authenticate('someone').errors[0].original_error.code for _ in range(2)]
+            assert codes == ['INVALID_CREDENTIALS', 'RATE_LIMITED']
+        assert authenticate.call_count == 3
+
+
+class EmailBackendTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="chowkidar", email="chowkidar@example.com")
+        cls.user.set_password("W3@kP@$$w0rb!")
+        cls.user.save()
+
+    def test_email_login_fetches_the_user_once(self):
+        with override_settings(AUTHENTICATION_BACKENDS=['chowkidar.auth.backends.ChowkidarAuthBackend']):
+            with self.assertNumQueries(1):
+                user = authenticate_user_from_credentials(email="chowkidar@example.com", password="W3@kP@$$w0rb!")
+            assert user == self.user
+            try:
+                authenticate_user_from_credentials(email="nobody@example.com", password="W3@kP@$$w0rb!")
+                assert False, 'unknown email should not authenticate'
+            except AuthError as e:
+                assert e.code == 'EMAIL_NOT_FOUND'
+
+    def test_unknown_email_falls_through_the_backends(self):
+        receiver = mock.Mock()
+        user_login_failed.connect(receiver)
+        backends = ['chowkidar.auth.backends.ChowkidarAuthBackend', 'django.contrib.auth.backends.ModelBackend']
+        try:
+            with override_settings(AUTHENTICATION_BACKENDS=backends), \
+                    mock.patch('django.contrib.auth.backends.ModelBackend.authenticate', return_value=None) as fallback:
+                with self.assertRaises(AuthError) as error:
+                    authenticate_user_from_credentials(email="nobody@example.com", password="W3@kP@$$w0rb!")
+        finally:
+            user_login_failed.disconnect(receiver)
+        assert error.exception.code == 'EMAIL_NOT_FOUND'
+        assert fallback.call_count == 1
+        assert receiver.call_count == 1
+
+
+class FingerprintTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="chowkidar", email="chowkidar@example.com")
+
+    def test_refresh_tokens_carry_a_compact_fingerprint(self):
+        request = RequestFactory().post('/graphql/', HTTP_USER_AGENT='Chowkidar/1.0')
+        data = generate_refresh_token_cookie_data_from_userID(userID=self.user.id, request=request)
+        fingerprint = decode_payload_from_token(token=data['token'])['fingerprint']
+        assert len(fingerprint) == 22 and 'ip' not in data['payload']
+        assert verify_fingerprint(fingerprint, ip='127.0.0.1', agent='Chowkidar/1.0')
+        assert not verify_fingerprint(fingerprint, ip='127.0.0.2', agent='Chowkidar/1.0')
+        assert fingerprint == encode_fingerprint(ip='127.0.0.1', agent='Chowkidar/1.0')
+        assert verify_refresh_token(data['token']).user_id == self.user.id
+
+    def test_signed_fingerprints_are_still_accepted(self):
+        request = RequestFactory().post('/graphql/', HTTP_USER_AGENT='Chowkidar/1.0')
+        rt = generate_refresh_token(userID=self.user.id, request=request)
+        data = generate_token_from_claims(claims={
+            'refreshToken': rt.get_token(),
+            'fingerprint': signing.dumps({'ip': '127.0.0.1', 'agent': 'Chowkidar/1.0'}),
+            'ip': '127.0.0.1',
+            'userAgent': 'Chowkidar/1.0'
+        }, expirationDelta=JWT_REFRESH_TOKEN_EXPIRATION_DELTA)
+        assert verify_refresh_token(data['token']) == rt
+
+
+class CompactRefreshTokenTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="chowkidar", email="chowkidar@example.com")
+
+    def test_both_cookie_formats_are_accepted(self):
+        request = RequestFactory().post('/graphql/', HTTP_USER_AGENT='Chowkidar/1.0')
+        with mock.patch('chowkidar.auth.handler.REFRESH_TOKEN_COOKIE_FORMAT', 'compact'):
+            compact = generate_refresh_token_cookie_data_from_userID(userID=self.user.id, request=request)
+        legacy = generate_refresh_token_cookie_data_from_userID(userID=self.user.id, request=request)
+        assert len(compact['token']) < 100 < len(legacy['token'])
+        assert verify_refresh_token(compact['token']).user_id == self.user.id
+        assert verify_refresh_token(legacy['token']).user_id == self.user.id
+
+        # forged cookies are rejected without a db lookup
+        with CaptureQueriesContext(connection) as queries:
+            try:
+                verify_refresh_token(compact['token'][:-22] + 'A' * 22)
+                assert False, 'token with a forged mac should not be verified'
+            except AuthError as e:
+                assert e.code == 'INVALID_REFRESH_TOKEN'
+        assert len(queries) == 0
+
+
+class AsyncGraphQLViewTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="chowkidar", email="chowkidar@example.com")
+        cls.user.set_password("W3@kP@$$w0rb!")
+        cls.user.save()
+
+    def execute(self, query, cookies=None):
+        view = AsyncGraphQLView.as_view(schema=schema)
+        request = RequestFactory().post(
+            '/graphql/', content_type='application/json', HTTP_USER_AGENT='Chowkidar/1.0',
+            data=json.dumps({'query': query})
+        )
+        request.COOKIES.update(cookies or {})
+        request.user = AnonymousUser()
+        return async_to_sync(view)(request)
+
+    def test_session_is_issued_and_refreshed(self):
+        assert asyncio.iscoroutinefunction(AsyncGraphQLView.as_view(schema=schema))
+        resp = self.execute(
+            'mutation { authenticateUser(username: "chowkidar", password: "W3@kP@$$w0rb!") { success } }'
+        )
+        assert json.loads(resp.content)['data']['authenticateUser']['success']
+        refreshToken = resp.cookies['JWT_REFRESH_TOKEN'].value
+
+        resp = self.execute('{ test }', cookies={'JWT_REFRESH_TOKEN': refreshToken})
+        assert json.loads(resp.content) == {'data': {'test': None}}
+        assert resp.cookies['JWT_TOKEN'].value
+
+
+class ChannelAuthMiddlewareTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="chowkidar", email="chowkidar@example.com")
+
+    def test_reconnects_fetch_the_user_once(self):
+        token = generate_token_from_claims(
+            claims={'userID': self.user.id, 'username': self.user.username}, expirationDelta=JWT_EXPIRATION_DELTA
+        )['token']
+        users = []
+
+        async def inner(scope, receive, send):
+            users.append(scope['user']._wrapped)
+
+        middleware = ChannelAuthMiddleware(inner)
+        scope = {'type': 'websocket', 'headers': [(b'cookie', ('a=b; JWT_TOKEN=%s' % token).encode('latin-1'))]}
+
+        async def connect_all():
+            await asyncio.gather(*[middleware(scope, None, None) for _ in range(5)])
+
+        channel_user_cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            async_to_sync(connect_all)()
+            async_to_sync(connect_all)()
+        # the user, once
+        assert len(queries) == 1
+        assert users == [self.user] * 10
+
+
+class SocketExpiryTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="chowkidar", email="chowkidar@example.com")
+
+    def test_only_expired_sockets_are_handed_over(self):
+        expired = []
+
+        async def on_expiry(connection):
+            expired.append(connection)
+
+        async def run():
+            wheel = ExpiryWheel(onExpiry=on_expiry, resolution=0.01)
+            soon = SocketConnection(userID=1, refreshToken=None, send=None, deadline=time.time() + 0.05)
+            later = SocketConnection(userID=2, refreshToken=None, send=None, deadline=time.time() + 60)
+            wheel.schedule(later)
+            wheel.schedule(soon)
+            await asyncio.sleep(0.2)
+            assert expired == [soon] and len(wheel) == 1
+            wheel.cancel(later)
+            await asyncio.sleep(0.05)
+            assert wheel._task.done()
+
+        async_to_sync(run)()
+
+    def test_socket_is_revalidated_then_closed(self):
+        request = RequestFactory().post('/graphql/', HTTP_USER_AGENT='Chowkidar/1.0')
+        data = generate_refresh_token_cookie_data_from_userID(userID=self.user.id, request=request)
+        sent = []
+
+        def revoke():
+            get_refresh_token_store().revoke(verify_refresh_token(data['token']))
+
+        async def send(message):
+            sent.append(message)
+
+        async def inner(scope, receive, send):
+            # revalidated with the refresh token on the first expiry, and closed on the next after it is revoked
+            await asyncio.sleep(0.15)
+            assert sent == []
+            await sync_to_async(revoke)()
+            while not sent:
+                await asyncio.sleep(0.01)
+
+        scope = {'type': 'websocket', 'headers': [(b'cookie', ('JWT_REFRESH_TOKEN=%s' % data['token']).encode())]}
+        with mock.patch('chowkidar.graphql.channel.CLOSE_SOCKETS_ON_TOKEN_EXPIRY', True), \
+                mock.patch('chowkidar.graphql.channel.JWT_EXPIRATION_DELTA', timedelta(seconds=0.1)), \
+                mock.patch.object(socket_expiry_wheel, 'resolution', 0.01):
+            async_to_sync(ChannelAuthMiddleware(inner))(scope, None, send)
+        assert sent == [{'type': 'websocket.close', 'code': 4001}]
+
+
+class RevocationEventTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="chowkidar", email="chowkidar@example.com")
+
+    def test_logout_closes_sockets_of_the_session(self):
+        request = RequestFactory().post('/graphql/', HTTP_USER_AGENT='Chowkidar/1.0')
+        data = generate_refresh_token_cookie_data_from_userID(userID=self.user.id, request=request)
+        other = generate_refresh_token_cookie_data_from_userID(userID=self.user.id, request=request)
+        sent = {}
+
+        def connect(name, token):
+            async def send(message):
+                sent[name] = message
+
+            async def inner(scope, receive, send):
+                for _ in range(50):
+                    if name in sent:
+                        return
+                    await asyncio.sleep(0.01)
+
+            scope = {'type': 'websocket', 'headers': [(b'cookie', ('JWT_REFRESH_TOKEN=%s' % token).encode())]}
+            return ChannelAuthMiddleware(inner)(scope, None, send)
+
+        def logout():
+            logoutRequest = RequestFactory().post('/graphql/', HTTP_USER_AGENT='Chowkidar/1.0')
+            logoutRequest.COOKIES['JWT_REFRESH_TOKEN'] = data['token']
+            logout_user(request=logoutRequest, result={}, status_code=200)
+
+        async def run():
+            sockets = asyncio.gather(connect('session', data['token']), connect('other', other['token']))
+            await asyncio.sleep(0.1)
+            await sync_to_async(logout)()
+            await sockets
+
+        with override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}), \
+                mock.patch('chowkidar.auth.revocation.REVOCATION_CHANNEL_LAYER', 'default'), \
+                mock.patch('chowkidar.graphql.channel.REVOCATION_CHANNEL_LAYER', 'default'):
+            async_to_sync(run)()
+        assert sent == {'session': {'type': 'websocket.close', 'code': 4001}}
+
+
+class RevocationEpochTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="chowkidar", email="chowkidar@example.com")
+
+    def setUp(self):
+        # revoking sessions by epoch is opt-in
+        for module in ['chowkidar.auth.verify', 'chowkidar.auth.context', 'chowkidar.graphql.channel']:
+            patcher = mock.patch('%s.REVOKE_SESSIONS_BY_EPOCH' % module, True)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        # epochs outlive the rolled back rows in the cache
+        cache.clear()
+
+    def test_sessions_issued_before_the_epoch_are_revoked(self):
+        cache.clear()
+        request = RequestFactory().post('/graphql/', HTTP_USER_AGENT='Chowkidar/1.0')
+        current = generate_refresh_token_cookie_data_from_userID(userID=self.user.id, request=request)
+        other = generate_refresh_token_cookie_data_from_userID(userID=self.user.id, request=request)
+        access = generate_token_from_claims(claims={'userID': self.user.id}, expirationDelta=timedelta(minutes=5))
+        assert resolve_user_from_tokens(token=access['token']) == self.user.id
+
+        # a later second than the one in which the access token was issued
+        with mock.patch('chowkidar.auth.epoch.timezone') as epochTimezone:
+            epochTimezone.now.return_value = timezone.now() + timedelta(seconds=2)
+            revoke_sessions_by_epoch(self.user.id, exclude=verify_refresh_token(current['token']))
+        with self.assertRaises(AuthError) as error:
+            verify_refresh_token(other['token'])
+        assert error.exception.code == 'REFRESH_TOKEN_REVOKED'
+        assert RefreshToken.objects.filter(user=self.user, revoked__isnull=True).count() == 1
+        assert verify_refresh_token(current['token']).user_id == self.user.id
+        assert resolve_user_from_tokens(token=access['token']) is None
+
+        # the epoch is read back from the db once the cache is lost
+        cache.clear()
+        assert resolve_user_from_tokens(token=access['token']) is None
+        assert verify_refresh_token(current['token']).user_id == self.user.id
+
+
+    def test_epoch_expiring_during_async_resolution(self):
+        token = generate_token_from_claims(claims={'userID': self.user.id}, expirationDelta=timedelta(minutes=5))
+        reads = []
+
+        def get(key, default=None):
+            # the epoch is cached on the first read, and expires right after
+            reads.append(key)
+            return (0, None) if len(reads) == 1 else default
+
+        request = AuthContextTest.get_request(JWT_TOKEN=token['token'])
+        with mock.patch('chowkidar.auth.epoch.caches', {'default': mock.Mock(get=get)}):
+            context = async_to_sync(get_auth_context_async)(request)
+        assert context.userID == self.user.id
+
+    def test_tokens_issued_right_after_the_epoch_are_accepted(self):
+        cache.clear()
+        revoke_sessions_by_epoch(self.user.id)
+        access = generate_token_from_claims(claims={'userID': self.user.id}, expirationDelta=timedelta(minutes=5))
+        assert resolve_user_from_tokens(token=access['token']) == self.user.id
+
+    def test_epochs_moved_by_other_workers_are_seen(self):
+        cache.clear()
+        request = RequestFactory().post('/graphql/', HTTP_USER_AGENT='Chowkidar/1.0')
+        first = generate_refresh_token_cookie_data_from_userID(userID=self.user.id, request=request)
+        second = generate_refresh_token_cookie_data_from_userID(userID=self.user.id, request=request)
+
+        def revoke_in_other_worker():
+            RevocationEpoch.objects.update_or_create(
+                user_id=self.user.id, defaults={'notBefore': timezone.now() + timedelta(seconds=2)}
+            )
+
+        # the per-process cache holds epochs only briefly
+        with mock.patch('chowkidar.auth.epoch.REVOCATION_EPOCH_LOCAL_CACHE_TTL', timedelta(0)):
+            assert get_revocation_epoch(self.user.id) == (0, None)
+            revoke_in_other_worker()
+            with self.assertRaises(AuthError):
+                verify_refresh_token(first['token'])
+
+        # & a published revocation evicts it right away
+        RevocationEpoch.objects.all().delete()
+        cache.clear()
+        assert get_revocation_epoch(self.user.id) == (0, None)
+        revoke_in_other_worker()
+        async_to_sync(handle_revocation)({'userID': str(self.user.id), 'tokens': None, 'exclude': None})
+        with self.assertRaises(AuthError):
+            verify_refresh_token(second['token'])
+
+
+class ImportTest(TestCase):
+
+    def test_graphql_is_importable_on_its_own(self):
+        for module in ['chowkidar.graphql', 'chowkidar.graphql.channel']:
+            result = subprocess.run(
+                [sys.executable, '-c', 'import django; django.setup(); import %s' % module],
+                capture_output=True, text=True
+            )
+            assert result.returncode == 0, result.stderr
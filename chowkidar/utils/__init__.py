@@ -7,5 +7,6 @@ __all__ = [
     'PermissionDenied',
     'generate_token_from_claims',
     'decode_payload_from_token',
+    'payload_cache',
     'generate_refresh_token',
 ]
@@ -4,14 +4,20 @@ import jwt
 
 from ..settings import (
     JWT_ISSUER,
-    JWT_ALGORITHM,
-    JWT_PRIVATE_KEY,
-    JWT_SECRET_KEY,
-    JWT_PUBLIC_KEY,
-    JWT_LEEWAY
+    JWT_LEEWAY,
+    JWT_PAYLOAD_CACHE,
+    JWT_PAYLOAD_CACHE_SIZE
 )
 
+from .cache import TTLCache
 from .exceptions import AuthError
+from .keyring import load_keyring_from_settings
+
+# Keys are parsed once, and reused for signing & verifying every token
+keyring = load_keyring_from_settings()
+
+# Verified payloads of tokens, keyed by the raw token, kept till the token expires
+payload_cache = TTLCache(maxsize=JWT_PAYLOAD_CACHE_SIZE)
 
 
 def generate_payload_from_claims(claims: dict, expirationDelta: timedelta) -> dict:
@@ -38,24 +44,29 @@ def generate_payload_from_claims(claims: dict, expirationDelta: timedelta) -> di
 
 
 def encode_payload(payload: object) -> str:
+    key = keyring.get_signing_key()
     return jwt.encode(
         # payload
         payload,
-        # private key or secret key
-        JWT_PRIVATE_KEY or JWT_SECRET_KEY,
-        algorithm=JWT_ALGORITHM
+        # parsed private key or secret key
+        key.signingKey,
+        algorithm=key.algorithm,
+        # kid of the key, so that the verifying key can be picked directly
+        headers=key.headers
     )
 
 
 def decode_token(token: str) -> object:
+    header = jwt.get_unverified_header(token)
+    key = keyring.get_verifying_key(header.get('kid'))
     return jwt.decode(
         token,
-        # public key or secret key
-        key=JWT_PUBLIC_KEY or JWT_SECRET_KEY,
+        # parsed public key or secret key
+        key=key.verifyingKey,
         verify=True,
-        algorithms=[JWT_ALGORITHM],
+        algorithms=[key.algorithm],
         # time margin in seconds for the expiration check
-        leeyway=JWT_LEEWAY,
+        leeway=JWT_LEEWAY,
         options={
             'require_iat': True,
             'require_exp': True,
@@ -71,17 +82,31 @@ def generate_token_from_claims(claims: dict, expirationDelta) -> object:
     return {"token": encode_payload(payload), "payload": payload}
 
 
+def get_leeway_seconds() -> float:
+    if isinstance(JWT_LEEWAY, timedelta):
+        return JWT_LEEWAY.total_seconds()
+    return JWT_LEEWAY
+
+
 def decode_payload_from_token(token: str) -> object:
+    if JWT_PAYLOAD_CACHE:
+        payload = payload_cache.get(token)
+        if payload is not None:
+            return dict(payload)
     try:
         payload = decode_token(token)
-        return payload
     except jwt.ExpiredSignatureError:
         raise AuthError('EXPIRED_TOKEN')
-    except jwt.InvalidTokenError:
+    except (jwt.InvalidTokenError, AuthError):
         raise AuthError('INVALID_TOKEN')
+    if JWT_PAYLOAD_CACHE:
+        # signature is verified only once per token, the cached payload lives only as long as the token
+        payload_cache.set(token, dict(payload), expiresAt=payload['exp'] + get_leeway_seconds())
+    return payload
 
 
 __all__ = [
     'generate_token_from_claims',
-    'decode_payload_from_token'
+    'decode_payload_from_token',
+    'payload_cache'
 ]
@@ -0,0 +1,103 @@
+from typing import Optional
+
+from jwt.algorithms import get_default_algorithms
+
+from .exceptions import AuthError
+
+
+class Key:
+    """
+    A JWT key identified by its kid, with its signing & verifying keys parsed once into reusable key objects.
+    A retired key is no longer used for signing, but continues to verify tokens it had issued till they expire.
+    """
+
+    def __init__(
+        self, algorithm: str, kid: str = None, secret_key=None, private_key=None, public_key=None, retired=False
+    ):
+        self.kid = kid
+        self.algorithm = algorithm
+        self.retired = retired
+        algorithms = get_default_algorithms()
+        if algorithm not in algorithms:
+            raise AuthError('Algorithm %s not supported for JWT' % algorithm, code='INVALID_ALGORITHM')
+        algo = algorithms[algorithm]
+
+        self.signingKey = None
+        if private_key or secret_key:
+            self.signingKey = algo.prepare_key(private_key or secret_key)
+
+        if public_key or secret_key:
+            self.verifyingKey = algo.prepare_key(public_key or secret_key)
+        elif self.signingKey is not None and hasattr(self.signingKey, 'public_key'):
+            # derive the public key of asymmetric algorithms from its private key
+            self.verifyingKey = self.signingKey.public_key()
+        else:
+            raise AuthError('A public or secret key is required for the JWT key %s' % kid, code='KEY_MISSING')
+
+    @property
+    def headers(self) -> Optional[dict]:
+        if self.kid is None:
+            return None
+        return {'kid': self.kid}
+
+
+class Keyring:
+    """
+    Holds all the keys accepted for verifying JWTs, looked up by their kid.
+    Tokens are signed with the first key that has not been retired.
+    """
+
+    def __init__(self, keys: list):
+        self.keys = {}
+        self.signingKey = None
+        for key in keys:
+            self.keys[key.kid] = key
+            if self.signingKey is None and not key.retired and key.signingKey is not None:
+                self.signingKey = key
+
+    def get_signing_key(self) -> Key:
+        if self.signingKey is None:
+            raise AuthError('No active key available for signing JWTs', code='KEY_MISSING')
+        return self.signingKey
+
+    def get_verifying_key(self, kid: str = None) -> Key:
+        """ Returns the key named by the kid header of a token, tokens without a kid map to the key without one """
+        try:
+            return self.keys[kid]
+        except KeyError:
+            raise AuthError('No key found for kid %s' % kid, code='INVALID_KEY_ID')
+
+
+def load_legacy_key(retired: bool = False) -> Key:
+    """ Key without a kid, configured through the legacy settings """
+    from ..settings import JWT_ALGORITHM, JWT_SECRET_KEY, JWT_PRIVATE_KEY, JWT_PUBLIC_KEY
+    if JWT_PRIVATE_KEY or JWT_PUBLIC_KEY:
+        return Key(algorithm=JWT_ALGORITHM, private_key=JWT_PRIVATE_KEY, public_key=JWT_PUBLIC_KEY, retired=retired)
+    return Key(algorithm=JWT_ALGORITHM, secret_key=JWT_SECRET_KEY, retired=retired)
+
+
+def load_keyring_from_settings() -> Keyring:
+    from ..settings import JWT_KEYS, JWT_ALGORITHM
+    if JWT_KEYS:
+        keys = [
+            Key(
+                kid=key.get('kid'),
+                algorithm=key.get('algorithm', JWT_ALGORITHM),
+                secret_key=key.get('secret_key'),
+                private_key=key.get('private_key'),
+                public_key=key.get('public_key'),
+                retired=key.get('retired', False)
+            ) for key in JWT_KEYS
+        ]
+        if all(key.kid is not None for key in keys):
+            # tokens issued before JWT_KEYS was set have no kid, and are verified by the legacy key till they expire
+            keys.append(load_legacy_key(retired=True))
+        return Keyring(keys=keys)
+    return Keyring(keys=[load_legacy_key()])
+
+
+__all__ = [
+    'Key',
+    'Keyring',
+    'load_keyring_from_settings'
+]
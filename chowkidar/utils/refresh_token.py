@@ -1,8 +1,16 @@
+import base64
+import hashlib
+import hmac
+from typing import Optional
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.http import HttpRequest
 
 from chowkidar.auth.fingerprint import get_user_ip_from_request, get_user_agent_from_request
 from chowkidar.models import RefreshToken
+from chowkidar.utils.jwt import decode_payload_from_token
+from chowkidar.store import get_refresh_token_store
 from chowkidar.settings import LOG_USER_IP_IN_REFRESH_TOKEN, LOG_USER_AGENT_IN_REFRESH_TOKEN
 
 UserModel = get_user_model()
@@ -15,9 +23,52 @@ def generate_refresh_token(userID: str, request: HttpRequest) -> RefreshToken:
     ip = None
     if LOG_USER_IP_IN_REFRESH_TOKEN:
         ip = get_user_ip_from_request(request)
-    return RefreshToken.objects.create(user_id=userID, ip=ip, userAgent=agent)
+    return get_refresh_token_store().create(userID=userID, ip=ip, userAgent=agent)
+
+
+# length of the base64url encoded mac of a compact refresh token
+COMPACT_REFRESH_TOKEN_MAC_LENGTH = 22
+
+
+def get_compact_refresh_token_mac(refreshToken: str, fingerprint: str) -> str:
+    """ Truncated HMAC-SHA256 (keyed from SECRET_KEY) of the refresh token & the fingerprint of its session """
+    key = hashlib.sha256(b'chowkidar.refresh-token' + settings.SECRET_KEY.encode()).digest()
+    message = ('%s\n%s' % (refreshToken, fingerprint)).encode()
+    return base64.urlsafe_b64encode(hmac.new(key, message, hashlib.sha256).digest()[:16]).rstrip(b'=').decode()
+
+
+def encode_compact_refresh_token(refreshToken: str, fingerprint: str) -> str:
+    """ Opaque refresh token cookie value as <token>.<fingerprint><mac>, instead of a JWT """
+    return '%s.%s%s' % (refreshToken, fingerprint, get_compact_refresh_token_mac(refreshToken, fingerprint))
+
+
+def decode_compact_refresh_token(value: str) -> tuple:
+    """ Splits a compact refresh token cookie into (token, fingerprint, mac), without verifying it """
+    refreshToken, signed = value.split('.')
+    fingerprint, mac = signed[:-COMPACT_REFRESH_TOKEN_MAC_LENGTH], signed[-COMPACT_REFRESH_TOKEN_MAC_LENGTH:]
+    return refreshToken, fingerprint, mac
+
+
+def is_compact_refresh_token(value: str) -> bool:
+    """ A JWT has 3 parts separated by dots, while a compact refresh token has 2 """
+    return value.count('.') == 1
+
+
+def get_refresh_token_from_cookie(value: str) -> Optional[str]:
+    """ Refresh token carried by a cookie of either format, without verifying it against the store """
+    if is_compact_refresh_token(value):
+        return value.split('.')[0]
+    try:
+        return decode_payload_from_token(token=value).get('refreshToken')
+    except Exception:
+        return None
 
 
 __all__ = [
-    'generate_refresh_token'
+    'generate_refresh_token',
+    'encode_compact_refresh_token',
+    'decode_compact_refresh_token',
+    'get_compact_refresh_token_mac',
+    'is_compact_refresh_token',
+    'get_refresh_token_from_cookie'
 ]
@@ -0,0 +1,47 @@
+import json
+from functools import lru_cache
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def encode_json(data) -> bytes:
+    """ Serializes data to JSON, with orjson when it is installed. Dates & other types are encoded as Django does """
+    if orjson is not None:
+        return orjson.dumps(
+            data, default=DjangoJSONEncoder().default,
+            # dates are passed to the default encoder, so that they are formatted the same as with json
+            option=orjson.OPT_PASSTHROUGH_DATETIME
+        )
+    return json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+
+
+@lru_cache(maxsize=None)
+def get_json_encoder():
+    """ Returns the function configured through GRAPHQL_JSON_ENCODER for serializing responses """
+    from ..settings import GRAPHQL_JSON_ENCODER
+    from .settings import import_string
+    return import_string(GRAPHQL_JSON_ENCODER)
+
+
+def json_response(data, status: int = 200, pretty: bool = False) -> HttpResponse:
+    """
+    Creates a JSON response, serializing data exactly once with the configured encoder - or indented with json
+    when pretty, as graphene_django does
+    """
+    if pretty:
+        content = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True, indent=2, separators=(',', ': '))
+    else:
+        content = get_json_encoder()(data)
+    return HttpResponse(content, status=status, content_type='application/json')
+
+
+__all__ = [
+    'encode_json',
+    'json_response'
+]